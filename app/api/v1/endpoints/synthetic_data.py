@@ -2,42 +2,173 @@
 Synthetic data generation and management endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
+from datetime import datetime
 import asyncio
+import base64
 import logging
+import time
 
-from app.core.database import get_database
-from app.services.synthetic_pipeline import SyntheticDataPipeline
+import asyncpg
+from arq.connections import ArqRedis
+from sqlalchemy import text
+
+from app.core.database import get_database, get_pg_pool
+from app.core.queue import get_arq_pool
+from app.services.embedding_service import EmbeddingService, get_embedding_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# SQL is hoisted to module level with nullable binds so the statement
+# text is identical on every call; per-request f-string composition
+# produced a different statement per filter combination and defeated
+# asyncpg's prepared-statement cache
+
+STATUS_COUNTS_SQL = """
+    SELECT name, n FROM pipeline_counters
+    WHERE name IN ('synthetic_patients', 'clinical_notes')
+"""
+
+LIST_PATIENTS_SQL = """
+    SELECT patient_id, created_at, resource_type
+    FROM synthetic_patients
+    WHERE ($2::timestamp IS NULL
+           OR (created_at, patient_id) < ($2::timestamp, $3::varchar))
+    ORDER BY created_at DESC, patient_id DESC
+    LIMIT $1
+"""
+
+LIST_NOTES_SQL = """
+    SELECT note_id, patient_id, specialty, prior_auth_required,
+           prior_auth_status, created_at, text_preview
+    FROM clinical_notes
+    WHERE ($2::varchar IS NULL OR specialty = $2::varchar)
+      AND (NOT $3::bool OR prior_auth_required = true)
+      AND ($4::timestamp IS NULL
+           OR (created_at, note_id) < ($4::timestamp, $5::varchar))
+    ORDER BY created_at DESC, note_id DESC
+    LIMIT $1
+"""
+
+SPECIALTY_COUNT_SQL = text(
+    "SELECT COUNT(*) FROM policy_chunks WHERE specialty = :specialty"
+)
+
+SET_EF_SEARCH_SQL = text("SELECT set_config('hnsw.ef_search', :ef, true)")
+
+SEARCH_POLICIES_PREFILTER_SQL = text("""
+    WITH filtered AS MATERIALIZED (
+        SELECT id, payer_id, policy_id, specialty, chunk_text,
+               chunk_embedding, metadata
+        FROM policy_chunks
+        WHERE specialty = :filter_specialty
+    )
+    SELECT * FROM (
+        SELECT
+            f.id,
+            f.payer_id,
+            f.policy_id,
+            f.specialty,
+            f.chunk_text,
+            1 - (f.chunk_embedding <=> CAST(:query_embedding AS vector)) AS similarity,
+            f.metadata
+        FROM filtered f
+        ORDER BY f.chunk_embedding <=> CAST(:query_embedding AS vector)
+        LIMIT :match_count
+    ) ranked
+    WHERE ranked.similarity >= :match_threshold
+""")
+
+SEARCH_POLICIES_HNSW_SQL = text("""
+    SELECT * FROM (
+        SELECT
+            pc.id,
+            pc.payer_id,
+            pc.policy_id,
+            pc.specialty,
+            pc.chunk_text,
+            1 - (pc.chunk_embedding <=> CAST(:query_embedding AS vector)) AS similarity,
+            pc.metadata
+        FROM policy_chunks pc
+        WHERE (:filter_specialty IS NULL OR pc.specialty = :filter_specialty)
+        ORDER BY pc.chunk_embedding_half <=> CAST(:query_embedding AS halfvec)
+        LIMIT :match_count
+    ) ranked
+    WHERE ranked.similarity >= :match_threshold
+""")
+
+# Below this many rows for a specialty we pre-filter on the B-Tree index
+# and do an exact kNN over the subset; HNSW post-filtering on a selective
+# predicate can return too few (or zero) matching rows.
+SPECIALTY_PREFILTER_THRESHOLD = 5000
+
+# Per-specialty row counts cached for a short TTL so we don't COUNT(*)
+# on every search request
+_specialty_count_cache: Dict[str, tuple] = {}
+_SPECIALTY_COUNT_TTL = 60.0
+
+# Status responses are cached briefly so concurrent pollers collapse
+# into a single DB hit per TTL window (per worker process)
+_status_cache: Optional[tuple] = None
+_status_cache_lock = asyncio.Lock()
+_STATUS_CACHE_TTL = 1.0
+
+
+def _encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode a keyset pagination cursor as base64 of '<timestamp>|<id>'"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """Decode a keyset pagination cursor; raises HTTP 400 on a malformed value"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, _, row_id = raw.partition("|")
+        return datetime.fromisoformat(timestamp), row_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+async def _get_specialty_count(db: AsyncSession, specialty: str) -> int:
+    """Get (cached) row count for a specialty in policy_chunks"""
+    now = time.monotonic()
+    cached = _specialty_count_cache.get(specialty)
+    if cached and now - cached[1] < _SPECIALTY_COUNT_TTL:
+        return cached[0]
+
+    result = await db.execute(SPECIALTY_COUNT_SQL, {"specialty": specialty})
+    count = result.scalar() or 0
+    _specialty_count_cache[specialty] = (count, now)
+    return count
+
 @router.post("/generate")
 async def generate_synthetic_data(
-    background_tasks: BackgroundTasks,
     num_patients: int = 500,
     specialties: List[str] = ["oncology", "rheumatology"],
-    db: AsyncSession = Depends(get_database)
+    arq_pool: ArqRedis = Depends(get_arq_pool)
 ):
     """
     Generate synthetic patient data using Synthea
+
+    The pipeline runs on a dedicated arq worker, not in this process;
+    generation takes minutes and would otherwise starve request handling.
     """
     try:
-        pipeline = SyntheticDataPipeline(db)
-        
-        # Run pipeline in background
-        background_tasks.add_task(
-            pipeline.run_full_pipeline,
-            num_patients=num_patients,
-            specialties=specialties
+        job = await arq_pool.enqueue_job(
+            "run_pipeline",
+            num_patients,
+            specialties
         )
-        
+
         return {
             "message": "Synthetic data generation started",
+            "run_id": job.job_id,
             "num_patients": num_patients,
             "specialties": specialties,
             "status": "in_progress"
@@ -48,25 +179,36 @@ async def generate_synthetic_data(
 
 
 @router.get("/status")
-async def get_generation_status(db: AsyncSession = Depends(get_database)):
+async def get_generation_status(pool: asyncpg.Pool = Depends(get_pg_pool)):
     """
     Get status of synthetic data generation
     """
+    global _status_cache
+
     try:
-        # Query database for current counts
-        from sqlalchemy import text
-        
-        patients_result = await db.execute(text("SELECT COUNT(*) FROM synthetic_patients"))
-        notes_result = await db.execute(text("SELECT COUNT(*) FROM clinical_notes"))
-        
-        patients_count = patients_result.scalar()
-        notes_count = notes_result.scalar()
-        
-        return {
-            "patients_generated": patients_count,
-            "clinical_notes": notes_count,
-            "status": "completed" if patients_count > 0 else "not_started"
-        }
+        async with _status_cache_lock:
+            now = time.monotonic()
+            if _status_cache and now - _status_cache[1] < _STATUS_CACHE_TTL:
+                return _status_cache[0]
+
+            # Trigger-maintained counters (see pipeline_counters in
+            # scripts/init.sql); O(1) instead of a COUNT(*) heap scan per
+            # poll. Both counters come back in one round-trip, so there is
+            # no second query left to fan out with asyncio.gather.
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(STATUS_COUNTS_SQL)
+
+            counts = {row["name"]: row["n"] for row in rows}
+            patients_count = counts.get("synthetic_patients", 0)
+            notes_count = counts.get("clinical_notes", 0)
+
+            response = {
+                "patients_generated": patients_count,
+                "clinical_notes": notes_count,
+                "status": "completed" if patients_count > 0 else "not_started"
+            }
+            _status_cache = (response, now)
+            return response
     except Exception as e:
         logger.error(f"Failed to get generation status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -75,31 +217,37 @@ async def get_generation_status(db: AsyncSession = Depends(get_database)):
 @router.get("/patients")
 async def list_synthetic_patients(
     limit: int = 10,
-    offset: int = 0,
-    db: AsyncSession = Depends(get_database)
+    cursor: Optional[str] = None,
+    pool: asyncpg.Pool = Depends(get_pg_pool)
 ):
     """
-    List synthetic patients
+    List synthetic patients with keyset pagination
     """
     try:
-        from sqlalchemy import text
-        
-        query = text("""
-            SELECT patient_id, created_at, 
-                   (fhir_bundle->>'resourceType') as resource_type
-            FROM synthetic_patients 
-            ORDER BY created_at DESC 
-            LIMIT :limit OFFSET :offset
-        """)
-        
-        result = await db.execute(query, {"limit": limit, "offset": offset})
-        patients = [dict(row._mapping) for row in result]
-        
+        # Keyset pagination on (created_at, patient_id): cost per page is
+        # O(limit) regardless of depth, unlike OFFSET which scans and
+        # discards every preceding row
+        cursor_ts = cursor_id = None
+        if cursor:
+            cursor_ts, cursor_id = _decode_cursor(cursor)
+
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(LIST_PATIENTS_SQL, limit, cursor_ts, cursor_id)
+
+        patients = [dict(row) for row in rows]
+
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = _encode_cursor(last["created_at"], last["patient_id"])
+
         return {
             "patients": patients,
             "limit": limit,
-            "offset": offset
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list patients: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -110,40 +258,30 @@ async def list_clinical_notes(
     specialty: str = None,
     prior_auth_only: bool = False,
     limit: int = 10,
-    offset: int = 0,
-    db: AsyncSession = Depends(get_database)
+    cursor: Optional[str] = None,
+    pool: asyncpg.Pool = Depends(get_pg_pool)
 ):
     """
-    List clinical notes with filtering options
+    List clinical notes with filtering options and keyset pagination
     """
     try:
-        from sqlalchemy import text
-        
-        where_conditions = []
-        params = {"limit": limit, "offset": offset}
-        
-        if specialty:
-            where_conditions.append("specialty = :specialty")
-            params["specialty"] = specialty
-            
-        if prior_auth_only:
-            where_conditions.append("prior_auth_required = true")
-        
-        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-        
-        query = text(f"""
-            SELECT note_id, patient_id, specialty, prior_auth_required, 
-                   prior_auth_status, created_at,
-                   LEFT(deidentified_text, 200) as text_preview
-            FROM clinical_notes 
-            {where_clause}
-            ORDER BY created_at DESC 
-            LIMIT :limit OFFSET :offset
-        """)
-        
-        result = await db.execute(query, params)
-        notes = [dict(row._mapping) for row in result]
-        
+        cursor_ts = cursor_id = None
+        if cursor:
+            cursor_ts, cursor_id = _decode_cursor(cursor)
+
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                LIST_NOTES_SQL,
+                limit, specialty, prior_auth_only, cursor_ts, cursor_id
+            )
+
+        notes = [dict(row) for row in rows]
+
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = _encode_cursor(last["created_at"], last["note_id"])
+
         return {
             "notes": notes,
             "filters": {
@@ -151,8 +289,10 @@ async def list_clinical_notes(
                 "prior_auth_only": prior_auth_only
             },
             "limit": limit,
-            "offset": offset
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list notes: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -163,39 +303,52 @@ async def search_similar_policies(
     query_text: str,
     specialty: str = None,
     limit: int = 5,
-    db: AsyncSession = Depends(get_database)
+    ef_search: Optional[int] = Query(default=None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_database),
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
 ):
     """
     Search for similar policy chunks using vector similarity
+
+    ef_search tunes the HNSW recall/latency trade-off for this request
+    only: higher values probe more of the graph (better recall), lower
+    values are faster.
     """
     try:
-        from services.embedding_service import EmbeddingService
-        from sqlalchemy import text
-        
-        embedding_service = EmbeddingService()
-        query_embedding = embedding_service.embed_text(query_text)
-        
-        # Convert to PostgreSQL array format
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-        
+        query_embedding = await embedding_service.embed_query_batched(query_text)
+
+        # Bound as a native pgvector parameter (codec registered in
+        # app.core.database), no Python-side string serialization
         params = {
-            "query_embedding": embedding_str,
+            "query_embedding": query_embedding,
             "match_threshold": 0.7,
             "match_count": limit,
             "filter_specialty": specialty
         }
-        
-        query = text("""
-            SELECT * FROM search_similar_policies(
-                :query_embedding::vector,
-                :match_threshold,
-                :match_count,
-                :filter_specialty
-            )
-        """)
-        
+
+        # Selective specialty filters get a B-Tree pre-filter + exact kNN
+        # over the (small) subset; HNSW applies the filter after the ANN
+        # probe, which can drop most or all matching rows. Everything else
+        # goes through the HNSW index with post-filtering.
+        use_prefilter = False
+        if specialty:
+            specialty_count = await _get_specialty_count(db, specialty)
+            use_prefilter = specialty_count < SPECIALTY_PREFILTER_THRESHOLD
+
+        # SET LOCAL scopes the setting to this transaction; set_config is
+        # used because SET LOCAL does not accept bind parameters
+        if ef_search is not None:
+            await db.execute(SET_EF_SEARCH_SQL, {"ef": str(ef_search)})
+
+        if use_prefilter:
+            query = SEARCH_POLICIES_PREFILTER_SQL
+        else:
+            query = SEARCH_POLICIES_HNSW_SQL
+
         result = await db.execute(query, params)
-        policies = [dict(row._mapping) for row in result]
+        # mappings().all() returns pre-built mapping views; building a
+        # fresh dict per row costs an allocation plus a hash per column
+        policies = result.mappings().all()
         
         return {
             "query": query_text,
@@ -39,9 +39,20 @@ class Settings(BaseSettings):
     
     # Embedding model (independent of LLM choice)
     embedding_model: str = Field(
-        default="sentence-transformers/all-MiniLM-L6-v2", 
+        default="sentence-transformers/all-MiniLM-L6-v2",
         env="EMBEDDING_MODEL"
     )
+    # "torch" (SentenceTransformer) or "onnx-int8" (quantized ONNX Runtime)
+    embedding_backend: str = Field(default="torch", env="EMBEDDING_BACKEND")
+    # Directory with the exported + quantized ONNX model, e.g. produced by
+    #   optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 \
+    #       --task feature-extraction models/minilm-onnx
+    #   optimum-cli onnxruntime quantize --avx512_vnni \
+    #       --onnx_model models/minilm-onnx --output models/minilm-onnx-int8
+    embedding_onnx_path: str = Field(
+        default="./models/minilm-onnx-int8",
+        env="EMBEDDING_ONNX_PATH"
+    )
     
     # LangChain Configuration
     langchain_tracing_v2: bool = Field(default=False, env="LANGCHAIN_TRACING_V2")
@@ -61,6 +72,9 @@ class Settings(BaseSettings):
     )
     n8n_api_key: Optional[str] = Field(default=None, env="N8N_API_KEY")
     
+    # Redis / task queue
+    redis_url: str = Field(default="redis://localhost:6379/0", env="REDIS_URL")
+
     # ChromaDB Configuration
     chroma_host: str = Field(default="localhost", env="CHROMA_HOST")
     chroma_port: int = Field(default=8000, env="CHROMA_PORT")
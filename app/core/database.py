@@ -4,24 +4,52 @@ Database connection and session management
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
+from sqlalchemy import event, text
 import asyncio
-from typing import AsyncGenerator
+import asyncpg
+from typing import AsyncGenerator, Optional
 import logging
 
+from pgvector.asyncpg import register_vector
+
 from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Create async engine
+# Parameterized vector queries are planned badly once Postgres switches
+# to a generic cached plan (seq scan instead of the ANN index), and JIT
+# compilation only adds latency on our short queries; force custom plans
+# and disable JIT at the connection level
+PG_SERVER_SETTINGS = {
+    "plan_cache_mode": "force_custom_plan",
+    "jit": "off",
+}
+
+# Create async engine with an explicitly sized connection pool so burst
+# load keeps warm connections (and asyncpg's prepared-statement caches)
+# instead of timing out waiting on the default-sized pool
 engine = create_async_engine(
     settings.database_url.replace("postgresql://", "postgresql+asyncpg://"),
     echo=settings.environment == "development",
     pool_pre_ping=True,
+    pool_size=max(10, settings.max_concurrent_requests // 4),
+    max_overflow=settings.max_concurrent_requests,
+    pool_timeout=30,
     pool_recycle=300,
+    connect_args={"server_settings": PG_SERVER_SETTINGS},
 )
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def _register_vector_codec(dbapi_connection, connection_record):
+    """
+    Register the pgvector codec on every new asyncpg connection so
+    embeddings can be bound as native vector parameters instead of
+    serialized to "[...]" strings in Python
+    """
+    dbapi_connection.run_async(register_vector)
+
 # Create session factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -32,6 +60,46 @@ async_session_maker = async_sessionmaker(
 # Base class for ORM models
 Base = declarative_base()
 
+# Raw asyncpg pool for the hot read endpoints; asyncpg prepares and
+# caches statements per connection, skipping SQLAlchemy's per-query
+# parse and result-packaging overhead for trivial selects
+pg_pool: Optional[asyncpg.Pool] = None
+
+
+async def init_pg_pool():
+    """
+    Create the shared asyncpg pool for read-heavy endpoints
+    """
+    global pg_pool
+    pg_pool = await asyncpg.create_pool(
+        settings.database_url,
+        min_size=5,
+        max_size=settings.max_concurrent_requests,
+        init=register_vector,
+        server_settings=PG_SERVER_SETTINGS,
+    )
+    logger.info("asyncpg pool initialized")
+
+
+async def close_pg_pool():
+    """
+    Close the shared asyncpg pool
+    """
+    global pg_pool
+    if pg_pool is not None:
+        await pg_pool.close()
+        pg_pool = None
+        logger.info("asyncpg pool closed")
+
+
+def get_pg_pool() -> asyncpg.Pool:
+    """
+    Dependency to get the shared asyncpg pool
+    """
+    if pg_pool is None:
+        raise RuntimeError("asyncpg pool not initialized - call init_pg_pool() on startup")
+    return pg_pool
+
 
 async def get_database() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -44,8 +112,6 @@ async def get_database() -> AsyncGenerator[AsyncSession, None]:
             logger.error(f"Database session error: {e}")
             await session.rollback()
             raise
-        finally:
-            await session.close()
 
 
 async def init_database():
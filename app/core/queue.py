@@ -0,0 +1,46 @@
+"""
+Task queue connection management (arq)
+"""
+
+from typing import Optional
+import logging
+
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Shared arq redis pool for enqueueing background jobs
+arq_pool: Optional[ArqRedis] = None
+
+
+async def init_arq_pool():
+    """
+    Create the shared arq pool for enqueueing worker jobs
+    """
+    global arq_pool
+    arq_pool = await create_pool(RedisSettings.from_dsn(settings.redis_url))
+    logger.info("arq pool initialized")
+
+
+async def close_arq_pool():
+    """
+    Close the shared arq pool
+    """
+    global arq_pool
+    if arq_pool is not None:
+        await arq_pool.close()
+        arq_pool = None
+        logger.info("arq pool closed")
+
+
+def get_arq_pool() -> ArqRedis:
+    """
+    Dependency to get the shared arq pool
+    """
+    if arq_pool is None:
+        raise RuntimeError("arq pool not initialized - call init_arq_pool() on startup")
+    return arq_pool
@@ -156,14 +156,14 @@ class ListPatientsResponse(BaseModel):
     
     patients: List[SyntheticPatientResponse] = Field(description="List of patients")
     limit: int = Field(description="Results limit")
-    offset: int = Field(description="Results offset")
-    
+    next_cursor: Optional[str] = Field(default=None, description="Cursor for the next page, None when exhausted")
+
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
                 "patients": [],
                 "limit": 10,
-                "offset": 0
+                "next_cursor": None
             }
         }
     )
@@ -175,15 +175,15 @@ class ListNotesResponse(BaseModel):
     notes: List[ClinicalNoteResponse] = Field(description="List of clinical notes")
     filters: Dict[str, Any] = Field(description="Applied filters")
     limit: int = Field(description="Results limit")
-    offset: int = Field(description="Results offset")
-    
+    next_cursor: Optional[str] = Field(default=None, description="Cursor for the next page, None when exhausted")
+
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
                 "notes": [],
                 "filters": {"specialty": "oncology", "prior_auth_only": True},
                 "limit": 10,
-                "offset": 0
+                "next_cursor": None
             }
         }
     )
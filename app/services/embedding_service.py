@@ -6,10 +6,13 @@ Generates vector embeddings using sentence-transformers for semantic search
 import asyncio
 import logging
 import numpy as np
+import re
 from typing import List, Dict, Any, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 import hashlib
-import pickle
+import sqlite3
 import os
 from pathlib import Path
 import torch
@@ -21,6 +24,22 @@ except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
     logging.warning("sentence-transformers not available. Embedding service will not work.")
 
+try:
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    ONNX_RUNTIME_AVAILABLE = True
+except ImportError:
+    ONNX_RUNTIME_AVAILABLE = False
+
+try:
+    # BLAKE3 hashes short strings several times faster than SHA-256;
+    # the cache key is computed on every lookup, so it shows up
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
 from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -29,177 +48,427 @@ settings = get_settings()
 
 class EmbeddingService:
     """Service for generating vector embeddings from text"""
-    
+
+    QUERY_CACHE_MAXSIZE = 4096
+
+    # Micro-batching: concurrent queries arriving within this window are
+    # coalesced into one model.encode() call
+    MICRO_BATCH_WINDOW = 0.005
+    MICRO_BATCH_MAX = 32
+
     def __init__(self, model_name: Optional[str] = None):
         self.model_name = model_name or settings.embedding_model
+        self.backend = settings.embedding_backend
         self.model = None
+        self.tokenizer = None
         self.cache_dir = Path("./cache/embeddings")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        
+
+        # Bounded in-memory LRU over normalized query text; repeated
+        # searches skip the transformer entirely
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_hits = 0
+        self._query_cache_misses = 0
+
+        # Lazily-started micro-batching queue (needs a running event loop)
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+
+        # Dedicated single-thread executor for encode() calls. The model
+        # serializes on its own tokenizer/device lock anyway, and using
+        # the shared default executor would let encodes queue behind
+        # unrelated I/O work (and vice versa)
+        self._encode_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="st-encode"
+        )
+
         self._initialize_model()
+
+        # Shared read-only fallback vector: empty-text and error paths
+        # return this same array instead of allocating a fresh
+        # dimension-sized buffer per call
+        self._zero_vec = np.zeros(self.embedding_dimension, dtype=np.float32)
+        self._zero_vec.setflags(write=False)
+
+        self._initialize_cache()
     
     def _initialize_model(self):
-        """Initialize the sentence transformer model"""
+        """Initialize the embedding model for the configured backend"""
+        if self.backend == "onnx-int8":
+            self._initialize_onnx_model()
+            return
+
         if not SENTENCE_TRANSFORMERS_AVAILABLE:
             logger.error("sentence-transformers not available. Cannot initialize embedding model.")
             raise ImportError("sentence-transformers package required for embedding service")
-        
+
         try:
             logger.info(f"Loading embedding model: {self.model_name}")
-            self.model = SentenceTransformer(self.model_name)
-            
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = SentenceTransformer(self.model_name, device=device)
+            if device == "cuda":
+                # FP16 halves activation memory and roughly doubles
+                # tensor-core throughput; MiniLM-class models tolerate it
+                self.model.half()
+
             # Get model dimension
             self.embedding_dimension = self.model.get_sentence_embedding_dimension()
             logger.info(f"Model loaded successfully. Embedding dimension: {self.embedding_dimension}")
-            
+
         except Exception as e:
             logger.error(f"Failed to load embedding model {self.model_name}: {e}")
             raise
+
+    def _initialize_onnx_model(self):
+        """Initialize the INT8-quantized ONNX Runtime backend"""
+        if not ONNX_RUNTIME_AVAILABLE:
+            logger.error("optimum/onnxruntime not available. Cannot initialize ONNX backend.")
+            raise ImportError("optimum[onnxruntime] package required for the onnx-int8 backend")
+
+        try:
+            model_path = settings.embedding_onnx_path
+            logger.info(f"Loading INT8 ONNX embedding model from: {model_path}")
+
+            # Leave half the cores to the event loop / other workers;
+            # VNNI int8 matmuls saturate quickly anyway
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = max(1, (os.cpu_count() or 2) // 2)
+
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                model_path,
+                session_options=session_options
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+            self.embedding_dimension = self.model.config.hidden_size
+            logger.info(f"ONNX model loaded. Embedding dimension: {self.embedding_dimension}")
+
+        except Exception as e:
+            logger.error(f"Failed to load ONNX embedding model: {e}")
+            raise
+
+    def _encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """Encode texts with the active backend, returning a 2D numpy array"""
+        if self.backend == "onnx-int8":
+            return self._encode_onnx(texts, batch_size)
+
+        # Normalizing at encode amortizes one sqrt per vector across all
+        # later similarity comparisons
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar
+        )
+
+    def _encode_onnx(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Encode via ONNX Runtime with attention-masked mean pooling"""
+        # Sort by length (character count approximates token count) so
+        # each batch pads to similar-length texts instead of the longest
+        # note in the whole input; results are un-permuted at the end.
+        # The torch path gets this for free from sentence-transformers.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        texts = [texts[i] for i in order]
+        embeddings = []
+
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            inputs = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                return_tensors="np"
+            )
+            outputs = self.model(**inputs)
+            hidden = np.asarray(outputs.last_hidden_state)
+
+            # Mean-pool over non-padding tokens, same pooling MiniLM uses
+            mask = inputs["attention_mask"][..., np.newaxis].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            # L2-normalize for parity with the torch backend
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            embeddings.append(pooled / np.clip(norms, 1e-9, None))
+
+        stacked = np.concatenate(embeddings, axis=0)
+        out = np.empty_like(stacked)
+        out[order] = stacked
+        return out
     
-    def embed_text(self, text: str) -> List[float]:
+    def embed_text(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text
-        
+
         Args:
             text: Input text to embed
-            
+
         Returns:
-            List of float values representing the embedding vector
+            Float32 numpy array representing the embedding vector
         """
         if not text or not text.strip():
             logger.warning("Empty text provided for embedding")
-            return [0.0] * self.embedding_dimension
-        
+            return self._zero_vec
+
         try:
             # Check cache first
             cached_embedding = self._get_cached_embedding(text)
             if cached_embedding is not None:
                 return cached_embedding
-            
-            # Generate new embedding
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            embedding_list = embedding.tolist()
-            
+
+            # Generate new embedding; stay in float32 numpy end-to-end --
+            # .tolist() boxed every dimension into a ~28-byte PyFloat
+            embedding = np.asarray(self._encode([text])[0], dtype=np.float32)
+
             # Cache the result
-            self._cache_embedding(text, embedding_list)
-            
-            return embedding_list
-            
+            self._cache_embedding(text, embedding)
+
+            return embedding
+
         except Exception as e:
             logger.error(f"Failed to generate embedding for text: {e}")
             # Return zero vector as fallback
-            return [0.0] * self.embedding_dimension
+            return self._zero_vec
     
-    async def embed_text_async(self, text: str) -> List[float]:
+    def embed_query(self, text: str) -> np.ndarray:
+        """
+        Generate embedding for a search query with an in-memory LRU cache
+
+        Queries are normalized (lowercased, whitespace collapsed) before
+        lookup so trivially different repeats of the same query hit the
+        cache.
+
+        Args:
+            text: Query text to embed
+
+        Returns:
+            Float32 numpy array representing the embedding vector
+        """
+        normalized = self._normalize_query(text)
+        if not normalized:
+            logger.warning("Empty query provided for embedding")
+            return self._zero_vec
+
+        cached = self._query_cache_get(normalized)
+        if cached is not None:
+            return cached
+
+        embedding = self.embed_text(normalized)
+        self._query_cache_put(normalized, embedding)
+        return embedding
+
+    async def embed_query_batched(self, text: str) -> np.ndarray:
+        """
+        Generate a query embedding through the micro-batching queue
+
+        Concurrent callers landing within MICRO_BATCH_WINDOW are encoded
+        in a single model.encode() call, which is nearly as fast as
+        encoding one query. Falls back to the query cache first.
+
+        Args:
+            text: Query text to embed
+
+        Returns:
+            Float32 numpy array representing the embedding vector
+        """
+        normalized = self._normalize_query(text)
+        if not normalized:
+            logger.warning("Empty query provided for embedding")
+            return self._zero_vec
+
+        cached = self._query_cache_get(normalized)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        if self._batch_queue is None:
+            self._batch_queue = asyncio.Queue()
+            self._batcher_task = loop.create_task(self._micro_batch_loop())
+
+        future: asyncio.Future = loop.create_future()
+        await self._batch_queue.put((normalized, future))
+        embedding = await future
+        self._query_cache_put(normalized, embedding)
+        return embedding
+
+    async def _micro_batch_loop(self):
+        """Drain the batch queue every MICRO_BATCH_WINDOW and encode in one call"""
+        while True:
+            item = await self._batch_queue.get()
+            pending = [item]
+
+            # Give concurrent requests a short window to pile up
+            await asyncio.sleep(self.MICRO_BATCH_WINDOW)
+            while len(pending) < self.MICRO_BATCH_MAX and not self._batch_queue.empty():
+                pending.append(self._batch_queue.get_nowait())
+
+            texts = [text for text, _ in pending]
+            try:
+                loop = asyncio.get_running_loop()
+                embeddings = await loop.run_in_executor(
+                    self._encode_pool, self.embed_batch, texts
+                )
+                for (_, future), embedding in zip(pending, embeddings):
+                    if not future.done():
+                        future.set_result(embedding)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    @staticmethod
+    def _normalize_query(text: str) -> str:
+        """Normalize query text for cache lookup"""
+        return re.sub(r'\s+', ' ', (text or '').strip().lower())
+
+    def _query_cache_get(self, normalized_text: str) -> Optional[np.ndarray]:
+        """Look up a normalized query in the bounded LRU cache"""
+        cached = self._query_cache.get(normalized_text)
+        if cached is not None:
+            self._query_cache.move_to_end(normalized_text)
+            self._query_cache_hits += 1
+            return cached
+        self._query_cache_misses += 1
+        return None
+
+    def _query_cache_put(self, normalized_text: str, embedding: np.ndarray):
+        """Store a query embedding, evicting the least recently used entry"""
+        self._query_cache[normalized_text] = embedding
+        self._query_cache.move_to_end(normalized_text)
+        while len(self._query_cache) > self.QUERY_CACHE_MAXSIZE:
+            self._query_cache.popitem(last=False)
+
+    async def embed_text_async(self, text: str) -> np.ndarray:
         """
         Async wrapper for embedding generation
-        Runs the embedding in a thread pool to avoid blocking
+        Runs the embedding on the dedicated encode thread to avoid blocking
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.embed_text, text)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._encode_pool, self.embed_text, text)
     
-    def embed_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+    def embed_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """
         Generate embeddings for multiple texts efficiently
-        
+
         Args:
             texts: List of input texts
             batch_size: Number of texts to process in each batch
-            
+
         Returns:
-            List of embedding vectors
+            Float32 numpy array of shape (len(texts), embedding_dimension)
         """
         if not texts:
-            return []
+            return np.empty((0, self.embedding_dimension), dtype=np.float32)
         
         try:
-            embeddings = []
-            
-            # Process in batches
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                
-                # Check cache for batch items
-                batch_embeddings = []
-                texts_to_embed = []
-                indices_to_embed = []
-                
-                for idx, text in enumerate(batch_texts):
-                    cached = self._get_cached_embedding(text)
-                    if cached is not None:
-                        batch_embeddings.append((i + idx, cached))
-                    else:
-                        texts_to_embed.append(text)
-                        indices_to_embed.append(i + idx)
-                
-                # Generate embeddings for non-cached texts
-                if texts_to_embed:
-                    new_embeddings = self.model.encode(
-                        texts_to_embed, 
-                        convert_to_numpy=True,
-                        batch_size=min(batch_size, len(texts_to_embed)),
-                        show_progress_bar=len(texts_to_embed) > 10
+            # One IN query resolves every cache key at once instead of a
+            # SELECT per text, and all hits are gathered from the mmap
+            # with a single fancy-index
+            keys = [self._get_cache_key(text) for text in texts]
+            key_rows = self._lookup_cache_rows(keys)
+
+            # Another process sharing the store may have assigned rows
+            # past our mapped capacity; remap to the on-disk size and
+            # treat anything still out of range as a miss
+            if key_rows and not self._reload_cache_if_grown(max(key_rows.values())):
+                key_rows = {
+                    key: row for key, row in key_rows.items()
+                    if row < self._cache_capacity
+                }
+
+            out = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+
+            hit_positions = [i for i, key in enumerate(keys) if key in key_rows]
+            if hit_positions:
+                try:
+                    rows = [key_rows[keys[i]] for i in hit_positions]
+                    out[hit_positions] = (
+                        self._cache_matrix[rows].astype(np.float32)
+                        * self._cache_scales[rows][:, None]
                     )
-                    
-                    # Cache new embeddings and add to results
-                    for idx, (text, embedding) in enumerate(zip(texts_to_embed, new_embeddings)):
-                        embedding_list = embedding.tolist()
-                        self._cache_embedding(text, embedding_list)
-                        batch_embeddings.append((indices_to_embed[idx], embedding_list))
-                
-                # Sort by original index and extract embeddings
-                batch_embeddings.sort(key=lambda x: x[0])
-                embeddings.extend([emb for _, emb in batch_embeddings])
-            
+                except Exception as e:
+                    # A failed cache read is not a failed embedding:
+                    # re-encode these texts instead of zero-filling them
+                    logger.warning(
+                        f"Cache gather failed; re-encoding {len(hit_positions)} texts: {e}"
+                    )
+                    hit_positions = []
+
+            hit_set = set(hit_positions)
+            miss_positions = [i for i in range(len(texts)) if i not in hit_set]
+            if miss_positions:
+                # Encode each distinct missing text once and scatter the
+                # result to every position it occupies; boilerplate
+                # sentences repeat heavily in clinical notes
+                unique_order: Dict[str, int] = {}
+                unique_texts: List[str] = []
+                for i in miss_positions:
+                    if texts[i] not in unique_order:
+                        unique_order[texts[i]] = len(unique_texts)
+                        unique_texts.append(texts[i])
+
+                new_embeddings = np.asarray(self._encode(
+                    unique_texts,
+                    batch_size=batch_size,
+                    show_progress_bar=len(unique_texts) > 10
+                ), dtype=np.float32)
+                out[miss_positions] = new_embeddings[
+                    [unique_order[texts[i]] for i in miss_positions]
+                ]
+
+                for text, embedding in zip(unique_texts, new_embeddings):
+                    self._cache_embedding(text, embedding)
+
             logger.info(f"Generated embeddings for {len(texts)} texts")
-            return embeddings
-            
+            return out
+
         except Exception as e:
             logger.error(f"Failed to generate batch embeddings: {e}")
             # Return zero vectors as fallback
-            return [[0.0] * self.embedding_dimension for _ in texts]
-    
-    async def embed_batch_async(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+            return np.broadcast_to(self._zero_vec, (len(texts), self.embedding_dimension))
+
+    async def embed_batch_async(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """
         Async wrapper for batch embedding generation
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.embed_batch, texts, batch_size)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._encode_pool, self.embed_batch, texts, batch_size
+        )
     
-    def compute_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+    def compute_similarity(self, embedding1: Union[List[float], np.ndarray], embedding2: Union[List[float], np.ndarray]) -> float:
         """
         Compute cosine similarity between two embeddings
-        
+
         Args:
             embedding1: First embedding vector
             embedding2: Second embedding vector
-            
+
         Returns:
             Cosine similarity score between -1 and 1
         """
         try:
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
-            
-            # Compute cosine similarity
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
+            # asarray is a no-op for float32 ndarrays from embed_text
+            vec1 = np.asarray(embedding1, dtype=np.float32)
+            vec2 = np.asarray(embedding2, dtype=np.float32)
+
+            # This method is public and takes arbitrary vectors, so
+            # divide by the norms even though embed_text output is
+            # already L2-normalized — one pair of norms is negligible
+            # and keeps the documented cosine contract honest (the
+            # zero-vector fallback still scores 0)
+            denom = float(np.linalg.norm(vec1) * np.linalg.norm(vec2))
+            if denom == 0.0:
                 return 0.0
-            
-            similarity = dot_product / (norm1 * norm2)
-            return float(similarity)
-            
+            return float(np.dot(vec1, vec2)) / denom
+
         except Exception as e:
             logger.error(f"Failed to compute similarity: {e}")
             return 0.0
     
     def find_most_similar(
-        self, 
-        query_embedding: List[float], 
-        candidate_embeddings: List[List[float]], 
+        self,
+        query_embedding: Union[List[float], np.ndarray],
+        candidate_embeddings: Union[List[List[float]], np.ndarray],
         top_k: int = 5
     ) -> List[tuple]:
         """
@@ -214,72 +483,255 @@ class EmbeddingService:
             List of (index, similarity_score) tuples, sorted by similarity
         """
         try:
-            similarities = []
-            
-            for idx, candidate in enumerate(candidate_embeddings):
-                similarity = self.compute_similarity(query_embedding, candidate)
-                similarities.append((idx, similarity))
-            
-            # Sort by similarity (descending) and return top_k
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            return similarities[:top_k]
-            
+            candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+            if candidates.size == 0:
+                return []
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+
+            # One BLAS matvec over all candidates instead of a Python
+            # loop of per-pair similarity calls
+            candidate_norms = np.linalg.norm(candidates, axis=1)
+            query_norm = np.linalg.norm(query)
+            denom = candidate_norms * query_norm
+            scores = np.divide(
+                candidates @ query,
+                denom,
+                out=np.zeros(len(candidates), dtype=np.float32),
+                where=denom != 0
+            )
+
+            # argpartition selects top_k in O(N); only those get sorted
+            top_k = min(top_k, len(scores))
+            top_idx = np.argpartition(-scores, top_k - 1)[:top_k]
+            top_idx = top_idx[np.argsort(-scores[top_idx])]
+
+            return [(int(idx), float(scores[idx])) for idx in top_idx]
+
         except Exception as e:
             logger.error(f"Failed to find similar embeddings: {e}")
             return []
     
+    # --- Persistent embedding cache -----------------------------------
+    # Structure-of-Arrays layout: one contiguous matrix memory-mapped
+    # from disk, plus a small SQLite index mapping text hash to matrix
+    # row. The previous one-pickle-file-per-text layout paid an
+    # open/read/unpickle round-trip (and a 4KB file) per cached text.
+    #
+    # Rows are stored as symmetric int8 with one float32 scale each
+    # (scale = max|v| / 127): 4x less disk and memory bandwidth than
+    # float32, and the quantization error is far below the noise floor
+    # of cosine similarity on sentence embeddings. Reads dequantize to
+    # float32, so callers see the same arrays as before.
+
+    CACHE_INITIAL_CAPACITY = 1024
+
+    def _initialize_cache(self):
+        """Open the memory-mapped embedding matrices and their SQLite key index"""
+        self._matrix_path = self.cache_dir / "embeddings.i8"
+        self._scales_path = self.cache_dir / "scales.f32"
+        self._cache_index = sqlite3.connect(
+            self.cache_dir / "key_index.sqlite",
+            check_same_thread=False
+        )
+        self._cache_index.execute("PRAGMA journal_mode=WAL")
+        self._cache_index.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+        )
+        self._cache_index.commit()
+
+        row_bytes = self.embedding_dimension
+        if self._matrix_path.exists() and self._matrix_path.stat().st_size >= row_bytes:
+            capacity = self._matrix_path.stat().st_size // row_bytes
+        else:
+            capacity = self.CACHE_INITIAL_CAPACITY
+            with open(self._matrix_path, "wb") as f:
+                f.truncate(capacity * row_bytes)
+        if not self._scales_path.exists() or self._scales_path.stat().st_size < capacity * 4:
+            with open(self._scales_path, "ab") as f:
+                f.truncate(capacity * 4)
+
+        self._cache_capacity = capacity
+        self._cache_matrix = np.memmap(
+            self._matrix_path,
+            dtype=np.int8,
+            mode="r+",
+            shape=(capacity, self.embedding_dimension)
+        )
+        self._cache_scales = np.memmap(
+            self._scales_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity,)
+        )
+    def _grow_cache(self):
+        """Double the memory-mapped matrices when they are full"""
+        # Another process sharing this store may already have grown the
+        # files; never truncate below what is on disk
+        on_disk = self._matrix_path.stat().st_size // self.embedding_dimension
+        new_capacity = max(self._cache_capacity * 2, on_disk)
+        self._cache_matrix.flush()
+        self._cache_scales.flush()
+        del self._cache_matrix
+        del self._cache_scales
+        with open(self._matrix_path, "r+b") as f:
+            f.truncate(new_capacity * self.embedding_dimension)
+        with open(self._scales_path, "r+b") as f:
+            f.truncate(new_capacity * 4)
+        self._cache_matrix = np.memmap(
+            self._matrix_path,
+            dtype=np.int8,
+            mode="r+",
+            shape=(new_capacity, self.embedding_dimension)
+        )
+        self._cache_scales = np.memmap(
+            self._scales_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(new_capacity,)
+        )
+        self._cache_capacity = new_capacity
+
+    def _reload_cache_if_grown(self, needed_row: int) -> bool:
+        """Remap the matrices when another process has grown the store
+
+        Row numbers come from the shared SQLite index, so a process that
+        did not do the growing can be handed rows past its own mapped
+        capacity. Returns True when needed_row is addressable afterwards.
+        """
+        if needed_row < self._cache_capacity:
+            return True
+        on_disk = self._matrix_path.stat().st_size // self.embedding_dimension
+        if on_disk > self._cache_capacity:
+            self._cache_matrix.flush()
+            self._cache_scales.flush()
+            del self._cache_matrix
+            del self._cache_scales
+            self._cache_matrix = np.memmap(
+                self._matrix_path,
+                dtype=np.int8,
+                mode="r+",
+                shape=(on_disk, self.embedding_dimension)
+            )
+            self._cache_scales = np.memmap(
+                self._scales_path,
+                dtype=np.float32,
+                mode="r+",
+                shape=(on_disk,)
+            )
+            self._cache_capacity = on_disk
+        return needed_row < self._cache_capacity
+
     def _get_cache_key(self, text: str) -> str:
         """Generate cache key for text"""
-        # Use hash of text + model name for cache key
-        content = f"{self.model_name}:{text}"
-        return hashlib.sha256(content.encode()).hexdigest()
-    
-    def _get_cached_embedding(self, text: str) -> Optional[List[float]]:
-        """Retrieve cached embedding for text"""
+        # Hash of text + model name; a 16-byte digest is plenty for a
+        # cache key and halves the hex-string overhead of full SHA-256
+        content = f"{self.model_name}:{text}".encode()
+        if BLAKE3_AVAILABLE:
+            return blake3.blake3(content).digest(length=16).hex()
+        return hashlib.sha256(content).hexdigest()[:32]
+
+    def _lookup_cache_rows(self, keys: List[str]) -> Dict[str, int]:
+        """Resolve cache keys to matrix rows in bulk with IN queries"""
+        rows: Dict[str, int] = {}
+        try:
+            # Chunked to stay under SQLite's bound-variable limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.update(self._cache_index.execute(
+                    f"SELECT hash, row FROM embeddings WHERE hash IN ({placeholders})",
+                    chunk
+                ).fetchall())
+        except Exception as e:
+            logger.debug(f"Batch cache lookup failed: {e}")
+        return rows
+
+    def _get_cached_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Retrieve cached embedding for text as a float32 array"""
         try:
             cache_key = self._get_cache_key(text)
-            cache_file = self.cache_dir / f"{cache_key}.pkl"
-            
-            if cache_file.exists():
-                with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
-            
-            return None
-            
+            row = self._cache_index.execute(
+                "SELECT row FROM embeddings WHERE hash = ?", (cache_key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            # Dequantize: the astype copy also takes the row out of the
+            # mmap, so callers hold no reference into the (growable)
+            # backing file
+            idx = row[0]
+            if not self._reload_cache_if_grown(idx):
+                return None
+            return self._cache_matrix[idx].astype(np.float32) * self._cache_scales[idx]
+
         except Exception as e:
             logger.debug(f"Cache retrieval failed: {e}")
             return None
-    
-    def _cache_embedding(self, text: str, embedding: List[float]):
+
+    def _cache_embedding(self, text: str, embedding):
         """Cache embedding for text"""
         try:
             cache_key = self._get_cache_key(text)
-            cache_file = self.cache_dir / f"{cache_key}.pkl"
-            
-            with open(cache_file, 'wb') as f:
-                pickle.dump(embedding, f)
-                
+
+            # The row slot is allocated by SQLite inside the INSERT, so
+            # concurrent writers (the API process and the pipeline
+            # worker share this store) serialize on the database write
+            # lock instead of racing independent in-memory counters
+            cur = self._cache_index.execute(
+                "INSERT OR IGNORE INTO embeddings (hash, row) "
+                "VALUES (?, (SELECT COALESCE(MAX(row), -1) + 1 FROM embeddings))",
+                (cache_key,)
+            )
+            self._cache_index.commit()
+            if cur.rowcount == 0:
+                # Duplicate key: the existing assignment owns its row
+                # and the bytes were written by whoever inserted it
+                return
+
+            # Write the matrix/scales bytes only for the row the index
+            # actually assigned to this hash
+            row = self._cache_index.execute(
+                "SELECT row FROM embeddings WHERE hash = ?", (cache_key,)
+            ).fetchone()[0]
+            while row >= self._cache_capacity:
+                self._grow_cache()
+
+            vector = np.asarray(embedding, dtype=np.float32)
+            scale = float(np.max(np.abs(vector))) / 127.0 or 1.0
+            self._cache_matrix[row] = np.round(vector / scale).astype(np.int8)
+            self._cache_scales[row] = scale
+
         except Exception as e:
             logger.debug(f"Cache storage failed: {e}")
-    
+
     def clear_cache(self):
         """Clear the embedding cache"""
         try:
-            for cache_file in self.cache_dir.glob("*.pkl"):
-                cache_file.unlink()
+            self._cache_index.execute("DELETE FROM embeddings")
+            self._cache_index.commit()
             logger.info("Embedding cache cleared")
         except Exception as e:
             logger.error(f"Failed to clear cache: {e}")
-    
+
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         try:
-            cache_files = list(self.cache_dir.glob("*.pkl"))
-            total_size = sum(f.stat().st_size for f in cache_files)
-            
+            total_size = sum(
+                path.stat().st_size
+                for path in (self._matrix_path, self._scales_path)
+                if path.exists()
+            )
+            cached = self._cache_index.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
             return {
-                "cached_embeddings": len(cache_files),
+                "cached_embeddings": cached,
                 "total_cache_size_mb": round(total_size / (1024 * 1024), 2),
+                "query_cache_hits": self._query_cache_hits,
+                "query_cache_misses": self._query_cache_misses,
+                "query_cache_size": len(self._query_cache),
                 "model_name": self.model_name,
                 "embedding_dimension": self.embedding_dimension
             }
@@ -290,16 +742,29 @@ class EmbeddingService:
     @property
     def is_ready(self) -> bool:
         """Check if the embedding service is ready to use"""
-        return self.model is not None and SENTENCE_TRANSFORMERS_AVAILABLE
-    
+        return self.model is not None
+
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the loaded model"""
         if not self.is_ready:
             return {"error": "Model not loaded"}
-        
+
         return {
             "model_name": self.model_name,
+            "backend": self.backend,
             "embedding_dimension": self.embedding_dimension,
             "max_sequence_length": getattr(self.model, 'max_seq_length', 'unknown'),
             "model_type": type(self.model).__name__
-        } 
\ No newline at end of file
+        }
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    """
+    Get the shared EmbeddingService instance
+
+    Loading a SentenceTransformer takes hundreds of ms, so the service is
+    created once and reused, mirroring get_settings() in app.core.config.
+    Suitable as a FastAPI dependency.
+    """
+    return EmbeddingService() 
\ No newline at end of file
@@ -1,28 +1,60 @@
 """
 FHIR Bundle Processing Service
 Extracts clinical notes and medical codes from FHIR bundles
+
+The module is kept free of dynamic tricks (no inner try/except, full
+annotations, plain dict/list types) so it can be compiled ahead of time
+for a 3-4x inner-loop speedup if bundle processing ever dominates:
+
+    mypyc app/services/fhir_processor.py
 """
 
+import itertools
 import json
 import logging
 import re
 import uuid
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+try:
+    # orjson parses roughly an order of magnitude faster than stdlib
+    # json; FHIR bundles routinely run to several MB
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
 class FHIRProcessor:
     """Service for processing FHIR bundles and extracting clinical data"""
     
+    # Compiled once: a single alternation scans each code in one linear
+    # pass instead of one Python-level substring search per keyword, and
+    # the winning named group is the specialty
+    _SPECIALTY_PATTERN = re.compile(
+        r"(?P<oncology>cancer|tumor|oncology|chemo)"
+        r"|(?P<rheumatology>arthritis|rheum|joint)"
+        r"|(?P<radiology>imaging|scan|mri|ct)"
+    )
+
     def __init__(self):
         self.specialty_mappings = {
             "363346000": "oncology",  # Malignant neoplastic disease
             "69896004": "rheumatology",  # Rheumatoid arthritis
             "439401001": "radiology",  # Diagnostic imaging
         }
+        self._specialty_snomed = frozenset(self.specialty_mappings)
     
+    @staticmethod
+    def from_bytes(raw: bytes) -> Dict[str, Any]:
+        """Parse a raw FHIR bundle, preferring orjson when installed"""
+        if ORJSON_AVAILABLE:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
     def extract_clinical_notes(self, bundle: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Extract clinical notes from FHIR bundle
@@ -34,148 +66,39 @@ class FHIRProcessor:
             List of clinical note dictionaries
         """
         notes = []
-        patient_id = self._extract_patient_id(bundle)
-        
+        patient_id = None
+
         try:
-            for entry in bundle.get('entry', []):
-                resource = entry.get('resource', {})
-                resource_type = resource.get('resourceType')
-                
-                # Process DocumentReference resources (clinical notes)
-                if resource_type == 'DocumentReference':
-                    note = self._process_document_reference(resource, patient_id)
-                    if note:
-                        notes.append(note)
-                
-                # Process DiagnosticReport resources
-                elif resource_type == 'DiagnosticReport':
-                    note = self._process_diagnostic_report(resource, patient_id)
-                    if note:
-                        notes.append(note)
-                
-                # Process Observation resources for prior auth status
-                elif resource_type == 'Observation':
-                    self._extract_prior_auth_status(resource, notes, patient_id)
-            
-            # Extract medical codes for all notes
+            # Codes are bundle-global, so notes, codes and the patient id
+            # are all collected in the same sweep; the old code re-walked
+            # the full bundle once per note via _extract_medical_codes and
+            # once more for the Patient resource
+            notes, codes, patient_id = self._walk_bundle(bundle)
+            patient_id = patient_id or str(uuid.uuid4())
+
+            # One shared codes dict and one specialty computation for the
+            # whole bundle; nothing downstream mutates per-note codes
+            specialty = self._determine_specialty(codes)
             for note in notes:
-                note['extracted_codes'] = self._extract_medical_codes(bundle)
-                note['specialty'] = self._determine_specialty(note['extracted_codes'])
-                
-        except Exception as e:
-            logger.error(f"Error extracting clinical notes from bundle: {e}")
-        
+                note['patient_id'] = patient_id
+                note['extracted_codes'] = codes
+                note['specialty'] = specialty
+
+        except Exception:
+            # Single guard for the whole walk; the inner helpers raise
+            # cleanly so their frames stay cheap for the specializing
+            # interpreter
+            logger.exception("Error extracting clinical notes from bundle")
+
         logger.info(f"Extracted {len(notes)} clinical notes for patient {patient_id}")
         return notes
-    
-    def _extract_patient_id(self, bundle: Dict[str, Any]) -> str:
-        """Extract patient ID from FHIR bundle"""
-        try:
-            for entry in bundle.get('entry', []):
-                resource = entry.get('resource', {})
-                if resource.get('resourceType') == 'Patient':
-                    return resource.get('id', str(uuid.uuid4()))
-            return str(uuid.uuid4())
-        except Exception:
-            return str(uuid.uuid4())
-    
-    def _process_document_reference(self, resource: Dict[str, Any], patient_id: str) -> Optional[Dict[str, Any]]:
-        """Process DocumentReference resource to extract clinical note"""
-        try:
-            # Extract text content
-            content = resource.get('content', [])
-            if not content:
-                return None
-            
-            # Get the first attachment with text data
-            attachment = content[0].get('attachment', {})
-            text_data = attachment.get('data') or attachment.get('url', '')
-            
-            if not text_data:
-                return None
-            
-            # Create note record
-            note = {
-                'note_id': resource.get('id', str(uuid.uuid4())),
-                'patient_id': patient_id,
-                'text': text_data,
-                'type': resource.get('type', {}).get('text', 'Clinical Note'),
-                'date': resource.get('date', datetime.now().isoformat()),
-                'prior_auth_required': False,
-                'prior_auth_status': 'pending'
-            }
-            
-            return note
-            
-        except Exception as e:
-            logger.error(f"Error processing DocumentReference: {e}")
-            return None
-    
-    def _process_diagnostic_report(self, resource: Dict[str, Any], patient_id: str) -> Optional[Dict[str, Any]]:
-        """Process DiagnosticReport resource to extract clinical note"""
-        try:
-            # Extract conclusion or presentedForm text
-            text_content = resource.get('conclusion', '')
-            
-            # If no conclusion, try to extract from presentedForm
-            if not text_content:
-                presented_forms = resource.get('presentedForm', [])
-                for form in presented_forms:
-                    if form.get('contentType') == 'text/plain':
-                        text_content = form.get('data', '')
-                        break
-            
-            if not text_content:
-                return None
-            
-            # Create note record
-            note = {
-                'note_id': resource.get('id', str(uuid.uuid4())),
-                'patient_id': patient_id,
-                'text': text_content,
-                'type': 'Diagnostic Report',
-                'date': resource.get('effectiveDateTime', datetime.now().isoformat()),
-                'prior_auth_required': False,
-                'prior_auth_status': 'pending'
-            }
-            
-            return note
-            
-        except Exception as e:
-            logger.error(f"Error processing DiagnosticReport: {e}")
-            return None
-    
-    def _extract_prior_auth_status(self, resource: Dict[str, Any], notes: List[Dict[str, Any]], patient_id: str):
-        """Extract prior authorization status from Observation resources"""
-        try:
-            # Check if this is a prior auth observation
-            code = resource.get('code', {})
-            coding = code.get('coding', [])
-            
-            for code_entry in coding:
-                if code_entry.get('code') == 'LA33-6':  # Prior Authorization Status
-                    # Extract the status value
-                    value_code = resource.get('valueCodeableConcept', {})
-                    value_coding = value_code.get('coding', [])
-                    
-                    for value_entry in value_coding:
-                        status_code = value_entry.get('code')
-                        if status_code in ['373066001', '373067005']:  # Approved/Denied
-                            status = 'approved' if status_code == '373066001' else 'denied'
-                            
-                            # Update all notes for this patient
-                            for note in notes:
-                                if note['patient_id'] == patient_id:
-                                    note['prior_auth_required'] = True
-                                    note['prior_auth_status'] = status
-                            break
-                    break
-                    
-        except Exception as e:
-            logger.error(f"Error extracting prior auth status: {e}")
-    
-    def _extract_medical_codes(self, bundle: Dict[str, Any]) -> Dict[str, List[str]]:
-        """Extract medical codes (ICD-10, CPT, SNOMED) from FHIR bundle"""
+
+    def _walk_bundle(
+        self, bundle: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]], Optional[str]]:
+        """Single pass over bundle entries collecting notes, codes and patient id"""
+        notes = []
+        patient_id = None
         codes = {
             'icd10': [],
             'cpt': [],
@@ -183,107 +106,184 @@ class FHIRProcessor:
             'hcpcs': [],
             'ndc': []
         }
-        
-        try:
-            for entry in bundle.get('entry', []):
-                resource = entry.get('resource', {})
-                resource_type = resource.get('resourceType')
-                
-                # Extract codes from Condition resources
-                if resource_type == 'Condition':
-                    self._extract_codes_from_condition(resource, codes)
-                
-                # Extract codes from Procedure resources
-                elif resource_type == 'Procedure':
-                    self._extract_codes_from_procedure(resource, codes)
-                
-                # Extract codes from MedicationRequest resources
-                elif resource_type == 'MedicationRequest':
-                    self._extract_codes_from_medication(resource, codes)
-                
-        except Exception as e:
-            logger.error(f"Error extracting medical codes: {e}")
-        
-        return codes
-    
-    def _extract_codes_from_condition(self, resource: Dict[str, Any], codes: Dict[str, List[str]]):
-        """Extract codes from Condition resource"""
-        try:
-            code = resource.get('code', {})
-            coding = code.get('coding', [])
-            
-            for code_entry in coding:
-                system = code_entry.get('system', '')
-                code_value = code_entry.get('code', '')
-                
-                if 'icd' in system.lower() and code_value:
-                    codes['icd10'].append(code_value)
-                elif 'snomed' in system.lower() and code_value:
-                    codes['snomed'].append(code_value)
-                    
-        except Exception as e:
-            logger.error(f"Error extracting codes from condition: {e}")
+
+        for entry in bundle.get('entry', []):
+            resource = entry.get('resource', {})
+            resource_type = resource.get('resourceType')
+
+            if resource_type == 'Patient':
+                if patient_id is None:
+                    patient_id = resource.get('id')
+
+            # Clinical note resources; patient_id is stamped on every
+            # note by the caller once the walk is complete
+            elif resource_type == 'DocumentReference':
+                note = self._process_document_reference(resource)
+                if note:
+                    notes.append(note)
+            elif resource_type == 'DiagnosticReport':
+                note = self._process_diagnostic_report(resource)
+                if note:
+                    notes.append(note)
+            elif resource_type == 'Observation':
+                self._extract_prior_auth_status(resource, notes)
+
+            # Medical code resources
+            elif resource_type in ('Condition', 'Procedure'):
+                self._extract_codes_from_coding(resource.get('code', {}), codes)
+            elif resource_type == 'MedicationRequest':
+                self._extract_codes_from_coding(
+                    resource.get('medicationCodeableConcept', {}), codes
+                )
+
+        return notes, codes, patient_id
+
+    def _process_document_reference(self, resource: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Process DocumentReference resource to extract clinical note"""
+        # Extract text content
+        content = resource.get('content', [])
+        if not content:
+            return None
+
+        # Get the first attachment with text data
+        attachment = content[0].get('attachment', {})
+        text_data = attachment.get('data') or attachment.get('url', '')
+
+        if not text_data:
+            return None
+
+        return {
+            'note_id': resource.get('id', str(uuid.uuid4())),
+            'text': text_data,
+            'type': resource.get('type', {}).get('text', 'Clinical Note'),
+            'date': resource.get('date', datetime.now().isoformat()),
+            'prior_auth_required': False,
+            'prior_auth_status': 'pending'
+        }
     
-    def _extract_codes_from_procedure(self, resource: Dict[str, Any], codes: Dict[str, List[str]]):
-        """Extract codes from Procedure resource"""
-        try:
-            code = resource.get('code', {})
-            coding = code.get('coding', [])
-            
-            for code_entry in coding:
-                system = code_entry.get('system', '')
-                code_value = code_entry.get('code', '')
-                
-                if 'cpt' in system.lower() and code_value:
-                    codes['cpt'].append(code_value)
-                elif 'hcpcs' in system.lower() and code_value:
-                    codes['hcpcs'].append(code_value)
-                elif 'snomed' in system.lower() and code_value:
-                    codes['snomed'].append(code_value)
-                    
-        except Exception as e:
-            logger.error(f"Error extracting codes from procedure: {e}")
+    def _process_diagnostic_report(self, resource: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Process DiagnosticReport resource to extract clinical note"""
+        # Extract conclusion or presentedForm text
+        text_content = resource.get('conclusion', '')
+
+        # If no conclusion, try to extract from presentedForm
+        if not text_content:
+            presented_forms = resource.get('presentedForm', [])
+            for form in presented_forms:
+                if form.get('contentType') == 'text/plain':
+                    text_content = form.get('data', '')
+                    break
+
+        if not text_content:
+            return None
+
+        return {
+            'note_id': resource.get('id', str(uuid.uuid4())),
+            'text': text_content,
+            'type': 'Diagnostic Report',
+            'date': resource.get('effectiveDateTime', datetime.now().isoformat()),
+            'prior_auth_required': False,
+            'prior_auth_status': 'pending'
+        }
     
-    def _extract_codes_from_medication(self, resource: Dict[str, Any], codes: Dict[str, List[str]]):
-        """Extract codes from MedicationRequest resource"""
-        try:
-            medication = resource.get('medicationCodeableConcept', {})
-            coding = medication.get('coding', [])
-            
-            for code_entry in coding:
-                system = code_entry.get('system', '')
-                code_value = code_entry.get('code', '')
-                
-                if 'ndc' in system.lower() and code_value:
-                    codes['ndc'].append(code_value)
-                    
-        except Exception as e:
-            logger.error(f"Error extracting codes from medication: {e}")
+    def _extract_prior_auth_status(self, resource: Dict[str, Any], notes: List[Dict[str, Any]]) -> None:
+        """Extract prior authorization status from Observation resources"""
+        # Check if this is a prior auth observation
+        code = resource.get('code', {})
+        coding = code.get('coding', [])
+
+        for code_entry in coding:
+            if code_entry.get('code') == 'LA33-6':  # Prior Authorization Status
+                # Extract the status value
+                value_code = resource.get('valueCodeableConcept', {})
+                value_coding = value_code.get('coding', [])
+
+                for value_entry in value_coding:
+                    status_code = value_entry.get('code')
+                    if status_code in ['373066001', '373067005']:  # Approved/Denied
+                        status = 'approved' if status_code == '373066001' else 'denied'
+
+                        # A bundle holds a single patient, so every
+                        # collected note gets the status
+                        for note in notes:
+                            note['prior_auth_required'] = True
+                            note['prior_auth_status'] = status
+                        break
+                break
     
+    # Canonical FHIR code-system URLs mapped straight to their bucket;
+    # one dict lookup replaces a lowercase + substring scan per coding
+    _SYSTEM_TO_BUCKET = {
+        "http://hl7.org/fhir/sid/icd-10": "icd10",
+        "http://hl7.org/fhir/sid/icd-10-cm": "icd10",
+        "http://snomed.info/sct": "snomed",
+        "http://www.ama-assn.org/go/cpt": "cpt",
+        "urn:oid:2.16.840.1.113883.6.285": "hcpcs",
+        "http://hl7.org/fhir/sid/ndc": "ndc",
+    }
+
+    # Substring fallback for non-canonical system strings only
+    _SYSTEM_SUBSTRINGS = (
+        ("icd", "icd10"),
+        ("snomed", "snomed"),
+        ("cpt", "cpt"),
+        ("hcpcs", "hcpcs"),
+        ("ndc", "ndc"),
+    )
+
+    def _extract_codes_from_coding(self, concept: Dict[str, Any], codes: Dict[str, List[str]]) -> None:
+        """Route each coding entry in a CodeableConcept to its code bucket"""
+        for code_entry in concept.get('coding', []):
+            system = code_entry.get('system', '')
+            code_value = code_entry.get('code', '')
+            if not code_value:
+                continue
+
+            bucket = self._SYSTEM_TO_BUCKET.get(system)
+            if bucket is None:
+                lowered = system.lower()
+                for needle, name in self._SYSTEM_SUBSTRINGS:
+                    if needle in lowered:
+                        bucket = name
+                        break
+
+            if bucket:
+                codes[bucket].append(code_value)
+
+    # Code shapes that appear in free-text narratives. One combined
+    # alternation finds every hit in a single pass; the NDC alternative
+    # sits before CPT so a hyphenated NDC is not split into 5-digit CPT
+    # lookalikes. If this pattern set grows, a JIT'd DFA engine
+    # (hyperscan) is the next step; at three patterns stdlib re is fine.
+    _NARRATIVE_CODE_PATTERN = re.compile(
+        r"\b(?P<icd10>[A-TV-Z][0-9]{1,2}(?:\.[0-9A-Z]{1,4})?)\b"
+        r"|\b(?P<ndc>[0-9]{4,5}-[0-9]{3,4}-[0-9]{1,2})\b"
+        r"|\b(?P<cpt>[0-9]{5})\b"
+    )
+
+    def extract_codes_from_narrative(self, text: str) -> Dict[str, List[str]]:
+        """Scan free text for ICD-10 / CPT / NDC shaped codes in one pass"""
+        codes: Dict[str, List[str]] = {'icd10': [], 'cpt': [], 'ndc': []}
+        for match in self._NARRATIVE_CODE_PATTERN.finditer(text):
+            codes[match.lastgroup].append(match.group())
+        return codes
+
     def _determine_specialty(self, extracted_codes: Dict[str, List[str]]) -> str:
         """Determine medical specialty based on extracted codes"""
-        try:
-            # Check SNOMED codes for specialty indicators
-            for snomed_code in extracted_codes.get('snomed', []):
-                if snomed_code in self.specialty_mappings:
-                    return self.specialty_mappings[snomed_code]
-            
-            # Default specialty based on code patterns
-            all_codes = []
-            for code_list in extracted_codes.values():
-                all_codes.extend(code_list)
-            
-            code_text = ' '.join(all_codes).lower()
-            
-            if any(term in code_text for term in ['cancer', 'tumor', 'oncology', 'chemo']):
-                return 'oncology'
-            elif any(term in code_text for term in ['arthritis', 'rheum', 'joint']):
-                return 'rheumatology'
-            elif any(term in code_text for term in ['imaging', 'scan', 'mri', 'ct']):
-                return 'radiology'
-            else:
-                return 'general'
-                
-        except Exception as e:
-            logger.error(f"Error determining specialty: {e}")
-            return 'general' 
\ No newline at end of file
+        # Check SNOMED codes for specialty indicators; the set
+        # intersection runs at C speed over the code list, and ties
+        # resolve in specialty_mappings insertion order
+        snomed_hits = self._specialty_snomed.intersection(extracted_codes.get('snomed', ()))
+        if snomed_hits:
+            for code, specialty in self.specialty_mappings.items():
+                if code in snomed_hits:
+                    return specialty
+
+        # Default specialty based on code patterns: scan each code
+        # directly rather than ' '.join-ing them into one big string
+        for code in itertools.chain.from_iterable(extracted_codes.values()):
+            match = self._SPECIALTY_PATTERN.search(code.lower())
+            if match:
+                return match.lastgroup
+
+        return 'general'
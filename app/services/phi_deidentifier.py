@@ -5,10 +5,19 @@ Uses Philter-py for HIPAA Safe Harbor compliant de-identification
 
 import asyncio
 import logging
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import Dict, Any, Optional
 import hashlib
 
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
 try:
     from philter import Philter
     PHILTER_AVAILABLE = True
@@ -16,16 +25,81 @@ except ImportError:
     PHILTER_AVAILABLE = False
     logging.warning("Philter-py not available. Using basic regex-based de-identification.")
 
+try:
+    # RE2 matches in guaranteed linear time (no backtracking), which
+    # also rules out ReDoS on adversarial note text
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Per-process de-identifier for pool workers; each worker process
+# compiles the pattern set (and loads Philter, if present) exactly once
+_worker_instance: Optional["PHIDeidentifier"] = None
+
+
+def _get_worker() -> "PHIDeidentifier":
+    global _worker_instance
+    if _worker_instance is None:
+        _worker_instance = PHIDeidentifier()
+    return _worker_instance
+
+
+def _deidentify_worker(text: str) -> str:
+    """De-identify one text inside a pool worker process"""
+    worker = _get_worker()
+    if worker.philter_client:
+        result = worker.philter_client.apply(text)
+        return result.filtered_text if hasattr(result, 'filtered_text') else str(result)
+    return worker._deidentify_with_fallback(text)
+
+
+def _deidentify_batch_worker(texts: list) -> list:
+    """De-identify a batch of texts inside a pool worker process"""
+    worker = _get_worker()
+    if worker.philter_client:
+        return [_deidentify_worker(text) for text in texts]
+    return worker._deidentify_fallback_batch(texts)
+
 
 class PHIDeidentifier:
     """Service for de-identifying PHI in clinical text"""
     
     def __init__(self):
         self.philter_client = None
+        self._executor: Optional[ProcessPoolExecutor] = None
         self.fallback_patterns = self._create_fallback_patterns()
-        
+
+        # One fused alternation for the substitution pass: a single
+        # C-level traversal of the text instead of one full re.sub scan
+        # per pattern. Alternatives keep dict order, so more specific
+        # rules (SSN) still win over generic digit runs (ZIP) at the
+        # same position. The per-pattern compiled dict stays around for
+        # validate_deidentification, which reports hits by name.
+        # If throughput ever becomes the pipeline bottleneck, the next
+        # rung is a SIMD multi-pattern engine (hyperscan) feeding a
+        # collect-matches-then-splice pass; sub() on the fused pattern
+        # already does the equivalent single traversal in C.
+        self._combined_pattern = self._compile(
+            "|".join(
+                f"(?P<{name}>{pattern.pattern})"
+                for name, (pattern, _) in self.fallback_patterns.items()
+            )
+        )
+        self._replacements = {
+            name: replacement
+            for name, (_, replacement) in self.fallback_patterns.items()
+        }
+
+        # Single alternation for the indicator sweep in validation;
+        # substring checks per indicator each lowercased the whole text
+        self._indicator_pattern = re.compile(
+            "|".join(map(re.escape, ['DOB', 'SSN', '@', 'phone', 'address', 'born on'])),
+            re.IGNORECASE
+        )
+
         if PHILTER_AVAILABLE:
             try:
                 self.philter_client = Philter()
@@ -50,49 +124,73 @@ class PHIDeidentifier:
             return text
         
         try:
-            if self.philter_client:
-                return await self._deidentify_with_philter(text)
-            else:
-                return self._deidentify_with_fallback(text)
+            # Regex de-identification is pure CPU work, so threads would
+            # serialize on the GIL; a process pool gives real parallelism
+            # across concurrent notes
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), _deidentify_worker, text
+            )
         except Exception as e:
             logger.error(f"De-identification failed: {e}")
-            # Return fallback even if Philter fails
+            # Last resort: run the fallback patterns in-process
             return self._deidentify_with_fallback(text)
-    
-    async def _deidentify_with_philter(self, text: str) -> str:
-        """De-identify using Philter-py"""
+
+    async def deidentify_batch(self, texts: list) -> list:
+        """
+        De-identify many notes in one worker round-trip
+
+        The fallback engine joins the batch on a sentinel and runs the
+        fused pattern once, so a thousand short notes cost one scan plus
+        one executor dispatch instead of a thousand of each.
+        """
+        if not texts:
+            return []
+
         try:
-            # Run Philter in thread pool since it may be CPU-intensive
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
-                self.philter_client.apply, 
-                text
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), _deidentify_batch_worker, texts
             )
-            
-            return result.filtered_text if hasattr(result, 'filtered_text') else str(result)
-            
         except Exception as e:
-            logger.error(f"Philter processing failed: {e}")
-            raise
-    
+            logger.error(f"Batch de-identification failed: {e}")
+            return [self._deidentify_with_fallback(text) for text in texts]
+
+    # Newlines bracket the marker: \n is ASCII whitespace, so it stops
+    # open-ended classes like the URL pattern's [^\s]+ even under
+    # re.ASCII / RE2, and the control characters keep the marker itself
+    # from looking like PHI
+    _BATCH_SEPARATOR = "\n\x1e__PHI_SEP__\x1e\n"
+
+    def _deidentify_fallback_batch(self, texts: list) -> list:
+        """Run the fused pattern once over sentinel-joined texts"""
+        joined = self._BATCH_SEPARATOR.join(texts)
+        result = self._splice_replacements(joined)
+        parts = result.split(self._BATCH_SEPARATOR)
+        if len(parts) != len(texts):
+            # A pattern matched across a join boundary and ate a
+            # sentinel; degrade to per-text scans rather than return
+            # misaligned results
+            logger.warning(
+                "Batch sentinel consumed by a PHI pattern; "
+                "falling back to per-text de-identification"
+            )
+            return [self._splice_replacements(text) for text in texts]
+        return parts
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Lazily create the shared worker pool (workers fork/spawn on first use)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return self._executor
+
     def _deidentify_with_fallback(self, text: str) -> str:
         """De-identify using regex patterns (fallback method)"""
         deidentified_text = text
         
         try:
-            # Apply each pattern
-            for pattern_name, pattern_info in self.fallback_patterns.items():
-                pattern = pattern_info['pattern']
-                replacement = pattern_info['replacement']
-                
-                deidentified_text = re.sub(
-                    pattern, 
-                    replacement, 
-                    deidentified_text, 
-                    flags=re.IGNORECASE | re.MULTILINE
-                )
-            
+            deidentified_text = self._splice_replacements(deidentified_text)
+
             logger.debug(f"Applied {len(self.fallback_patterns)} de-identification patterns")
             return deidentified_text
             
@@ -100,103 +198,127 @@ class PHIDeidentifier:
             logger.error(f"Fallback de-identification failed: {e}")
             return "[DE-IDENTIFICATION FAILED]"
     
-    def _create_fallback_patterns(self) -> Dict[str, Dict[str, str]]:
-        """Create regex patterns for basic PHI de-identification"""
-        return {
+    @staticmethod
+    def _compile(source: str):
+        """Compile through RE2 when installed, falling back to stdlib re"""
+        if RE2_AVAILABLE:
+            try:
+                # google-re2 takes no flag mask; inline flags set
+                # case-insensitive + multiline instead
+                return re2.compile(f"(?im){source}")
+            except Exception:
+                # RE2 rejects constructs like backreferences, and older
+                # wrapper versions differ in API surface; degrade to
+                # stdlib re rather than fail construction
+                pass
+        # ASCII keeps \b/\d/\w and case folding byte-simple instead of
+        # consulting Unicode tables per character; every pattern here
+        # targets ASCII-shaped tokens (digits, URLs, [A-Z] runs)
+        return re.compile(source, re.IGNORECASE | re.MULTILINE | re.ASCII)
+
+    def _splice_replacements(self, text: str) -> str:
+        """Replace fused-pattern matches by splicing segments around them
+
+        PHI hits are sparse (a few dozen per multi-KB note), so keeping
+        the untouched segments as slices and joining once beats sub()'s
+        per-match callback machinery; with no matches at all the
+        original string comes back without a copy.
+        """
+        segments = []
+        last_end = 0
+        for match in self._combined_pattern.finditer(text):
+            segments.append(text[last_end:match.start()])
+            segments.append(self._replacements[match.lastgroup])
+            last_end = match.end()
+
+        if not segments:
+            return text
+        segments.append(text[last_end:])
+        return "".join(segments)
+
+    def _create_fallback_patterns(self) -> Dict[str, tuple]:
+        """Compile regex patterns for basic PHI de-identification"""
+        raw_patterns = {
             # Names (basic patterns)
-            'names': {
-                'pattern': r'\b[A-Z][a-z]+ [A-Z][a-z]+\b',
-                'replacement': '[NAME]'
-            },
-            
+            'names': (r'\b[A-Z][a-z]+ [A-Z][a-z]+\b', '[NAME]'),
+
             # Social Security Numbers
-            'ssn': {
-                'pattern': r'\b\d{3}-?\d{2}-?\d{4}\b',
-                'replacement': '[SSN]'
-            },
-            
+            'ssn': (r'\b\d{3}-?\d{2}-?\d{4}\b', '[SSN]'),
+
             # Phone Numbers
-            'phone': {
-                'pattern': r'\b(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})\b',
-                'replacement': '[PHONE]'
-            },
-            
+            'phone': (r'\b(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})\b', '[PHONE]'),
+
             # Email Addresses
-            'email': {
-                'pattern': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-                'replacement': '[EMAIL]'
-            },
-            
+            'email': (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
+
             # Medical Record Numbers (MRN)
-            'mrn': {
-                'pattern': r'\b(?:MRN|Medical Record|Patient ID):?\s*([A-Z0-9]{6,})\b',
-                'replacement': r'MRN: [MRN]'
-            },
-            
+            'mrn': (r'\b(?:MRN|Medical Record|Patient ID):?\s*([A-Z0-9]{6,})\b', r'MRN: [MRN]'),
+
             # Dates (MM/DD/YYYY, MM-DD-YYYY, Month DD, YYYY)
-            'dates': {
-                'pattern': r'\b(?:\d{1,2}[/\-]\d{1,2}[/\-]\d{4}|(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4})\b',
-                'replacement': '[DATE]'
-            },
-            
+            'dates': (r'\b(?:\d{1,2}[/\-]\d{1,2}[/\-]\d{4}|(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4})\b', '[DATE]'),
+
             # Ages over 89
-            'ages_over_89': {
-                'pattern': r'\b(?:age\s+)?(?:9[0-9]|[1-9]\d{2,})\s*(?:years?\s*old|y\.?o\.?)\b',
-                'replacement': '[AGE>89]'
-            },
-            
+            'ages_over_89': (r'\b(?:age\s+)?(?:9[0-9]|[1-9]\d{2,})\s*(?:years?\s*old|y\.?o\.?)\b', '[AGE>89]'),
+
             # ZIP codes (5 digit codes, keeping only first 3 if needed)
-            'zip_specific': {
-                'pattern': r'\b\d{5}(?:-\d{4})?\b',
-                'replacement': '[ZIP]'
-            },
-            
-            # Vehicle identifiers
-            'vehicle_ids': {
-                'pattern': r'\b[A-Z0-9]{17}\b',  # VIN numbers
-                'replacement': '[VIN]'
-            },
-            
+            'zip_specific': (r'\b\d{5}(?:-\d{4})?\b', '[ZIP]'),
+
+            # Vehicle identifiers (VIN numbers)
+            'vehicle_ids': (r'\b[A-Z0-9]{17}\b', '[VIN]'),
+
             # Account numbers
-            'account_numbers': {
-                'pattern': r'\b(?:Account|Acct)\.?\s*#?\s*([A-Z0-9]{8,})\b',
-                'replacement': r'Account: [ACCOUNT]'
-            },
-            
+            'account_numbers': (r'\b(?:Account|Acct)\.?\s*#?\s*([A-Z0-9]{8,})\b', r'Account: [ACCOUNT]'),
+
             # URLs
-            'urls': {
-                'pattern': r'https?://[^\s]+',
-                'replacement': '[URL]'
-            },
-            
+            # \x1e is excluded so a URL can never run through the batch
+            # sentinel (under re.ASCII / RE2, \s alone would not stop it)
+            'urls': (r'https?://[^\s\x1e]+', '[URL]'),
+
             # IP Addresses
-            'ip_addresses': {
-                'pattern': r'\b(?:\d{1,3}\.){3}\d{1,3}\b',
-                'replacement': '[IP]'
-            }
+            'ip_addresses': (r'\b(?:\d{1,3}\.){3}\d{1,3}\b', '[IP]')
+        }
+
+        # Compiled once here: passing raw strings to re.sub/re.findall
+        # per call pays an SRE parse or cache probe on every note
+        return {
+            name: (self._compile(source), replacement)
+            for name, (source, replacement) in raw_patterns.items()
         }
     
+    # One formatter per PHI type, built once at class scope; only the
+    # chosen replacement is formatted instead of allocating a fresh
+    # 8-entry dict (and discarding 7 f-strings) on every cache miss
+    _REPLACEMENT_BUILDERS = {
+        'NAME': lambda h: f"Patient_{h}",
+        'SSN': lambda h: f"XXX-XX-{h[:4]}",
+        'PHONE': lambda h: f"({h[:3]}) {h[3:6]}-{h[6:]}",
+        'EMAIL': lambda h: f"patient_{h}@example.com",
+        'MRN': lambda h: f"MRN_{h}",
+        'DATE': lambda h: f"[DATE_{h[:4]}]",
+        'ZIP': lambda h: f"{h[:5]}",
+        'ACCOUNT': lambda h: f"ACCT_{h}",
+    }
+
+    @lru_cache(maxsize=65536)
     def generate_synthetic_replacement(self, phi_type: str, original_value: str) -> str:
         """
         Generate consistent synthetic replacements for PHI
         This ensures the same PHI value gets the same replacement across all notes
         """
-        # Create a hash of the original value for consistency
+        # Hash the original value for consistency. The same PHI recurs
+        # constantly within a patient's notes, so repeat calls are a
+        # cache hit; misses hash with BLAKE3 (SIMD) when installed
+        # rather than software MD5
         hash_input = f"{phi_type}_{original_value}".encode()
-        hash_value = hashlib.md5(hash_input).hexdigest()[:8].upper()
-        
-        replacements = {
-            'NAME': f"Patient_{hash_value}",
-            'SSN': f"XXX-XX-{hash_value[:4]}",
-            'PHONE': f"({hash_value[:3]}) {hash_value[3:6]}-{hash_value[6:]}",
-            'EMAIL': f"patient_{hash_value}@example.com",
-            'MRN': f"MRN_{hash_value}",
-            'DATE': f"[DATE_{hash_value[:4]}]",
-            'ZIP': f"{hash_value[:5]}",
-            'ACCOUNT': f"ACCT_{hash_value}"
-        }
-        
-        return replacements.get(phi_type, f"[{phi_type}_{hash_value}]")
+        if BLAKE3_AVAILABLE:
+            hash_value = blake3.blake3(hash_input).digest(length=4).hex().upper()
+        else:
+            hash_value = hashlib.sha256(hash_input).hexdigest()[:8].upper()
+
+        builder = self._REPLACEMENT_BUILDERS.get(phi_type)
+        if builder is None:
+            return f"[{phi_type}_{hash_value}]"
+        return builder(hash_value)
     
     def validate_deidentification(self, original_text: str, deidentified_text: str) -> Dict[str, Any]:
         """
@@ -213,28 +335,29 @@ class PHIDeidentifier:
         }
         
         try:
-            # Check for potential remaining PHI using patterns
-            for pattern_name, pattern_info in self.fallback_patterns.items():
-                matches = re.findall(pattern_info['pattern'], deidentified_text, re.IGNORECASE)
-                if matches:
-                    validation_result['is_valid'] = False
-                    validation_result['issues'].append(f"Potential {pattern_name} found: {len(matches)} instances")
-                    validation_result['phi_detected'].extend(matches)
-            
+            # Check for potential remaining PHI with one pass of the
+            # fused matcher, grouping hits by pattern name, instead of a
+            # full text scan per pattern
+            matches_by_pattern: Dict[str, list] = {}
+            for match in self._combined_pattern.finditer(deidentified_text):
+                matches_by_pattern.setdefault(match.lastgroup, []).append(match.group())
+
+            for pattern_name, matches in matches_by_pattern.items():
+                validation_result['is_valid'] = False
+                validation_result['issues'].append(f"Potential {pattern_name} found: {len(matches)} instances")
+                validation_result['phi_detected'].extend(matches)
+
             # Calculate text reduction ratio
             original_length = len(original_text)
             deidentified_length = len(deidentified_text)
-            
+
             if original_length > 0:
                 validation_result['reduction_ratio'] = (original_length - deidentified_length) / original_length
-            
+
             # Check for common PHI indicators that might have been missed
-            phi_indicators = ['DOB', 'SSN', '@', 'phone', 'address', 'born on']
-            remaining_indicators = [
-                indicator for indicator in phi_indicators 
-                if indicator.lower() in deidentified_text.lower()
-            ]
-            
+            remaining_indicators = sorted(
+                {hit.lower() for hit in self._indicator_pattern.findall(deidentified_text)}
+            )
             if remaining_indicators:
                 validation_result['issues'].append(f"PHI indicators still present: {remaining_indicators}")
             
@@ -0,0 +1,49 @@
+"""
+arq worker for the synthetic data pipeline
+
+Run with:
+    arq app.workers.pipeline_worker.WorkerSettings
+
+Long pipeline runs execute here instead of in the API workers, so
+generation never starves request handlers and can be scaled out by
+adding worker processes.
+"""
+
+from typing import Any, Dict, List
+import logging
+
+from arq.connections import RedisSettings
+
+from app.core.config import get_settings
+from app.core.database import async_session_maker
+from app.services.synthetic_pipeline import SyntheticDataPipeline
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+async def run_pipeline(
+    ctx: Dict[str, Any],
+    num_patients: int,
+    specialties: List[str]
+) -> Dict[str, Any]:
+    """
+    Run the full synthetic data pipeline as a worker job
+    """
+    logger.info(f"Worker starting pipeline run for {num_patients} patients")
+    async with async_session_maker() as session:
+        pipeline = SyntheticDataPipeline(session)
+        return await pipeline.run_full_pipeline(
+            num_patients=num_patients,
+            specialties=specialties
+        )
+
+
+class WorkerSettings:
+    """arq worker configuration"""
+
+    functions = [run_pipeline]
+    redis_settings = RedisSettings.from_dsn(settings.redis_url)
+    # Pipeline runs take minutes; one at a time per worker process
+    max_jobs = 1
+    job_timeout = 3600
@@ -6,6 +6,8 @@ CREATE TABLE IF NOT EXISTS synthetic_patients (
     id SERIAL PRIMARY KEY,
     patient_id VARCHAR(255) UNIQUE NOT NULL,
     fhir_bundle JSONB NOT NULL,
+    -- Materialized so listing does not decompress the JSONB per row
+    resource_type TEXT GENERATED ALWAYS AS (fhir_bundle->>'resourceType') STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -16,6 +18,9 @@ CREATE TABLE IF NOT EXISTS clinical_notes (
     note_id VARCHAR(255) UNIQUE NOT NULL,
     original_text TEXT NOT NULL,
     deidentified_text TEXT,
+    embedding vector(384), -- all-MiniLM-L6-v2 produces 384-dim vectors
+    -- Stored preview so the list endpoint never detoasts the full note
+    text_preview TEXT GENERATED ALWAYS AS (left(deidentified_text, 200)) STORED,
     extracted_codes JSONB,
     specialty VARCHAR(100),
     prior_auth_required BOOLEAN DEFAULT FALSE,
@@ -32,16 +37,62 @@ CREATE TABLE IF NOT EXISTS policy_chunks (
     specialty VARCHAR(100),
     chunk_text TEXT NOT NULL,
     chunk_embedding vector(384), -- all-MiniLM-L6-v2 produces 384-dim vectors
+    -- FP16 copy: half the bytes per row, so HNSW scans move half the
+    -- memory; FP32 column is kept for exact re-ranking
+    chunk_embedding_half halfvec(384) GENERATED ALWAYS AS (chunk_embedding::halfvec(384)) STORED,
     metadata JSONB,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Incrementally-maintained row counters so status polling does not run
+-- COUNT(*) heap scans against the growing tables
+CREATE TABLE IF NOT EXISTS pipeline_counters (
+    name TEXT PRIMARY KEY,
+    n BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO pipeline_counters (name, n) VALUES
+    ('synthetic_patients', 0),
+    ('clinical_notes', 0)
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_pipeline_counter()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE pipeline_counters SET n = n + 1 WHERE name = TG_TABLE_NAME;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE pipeline_counters SET n = n - 1 WHERE name = TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_synthetic_patients_counter ON synthetic_patients;
+CREATE TRIGGER trg_synthetic_patients_counter
+    AFTER INSERT OR DELETE ON synthetic_patients
+    FOR EACH ROW EXECUTE FUNCTION bump_pipeline_counter();
+
+DROP TRIGGER IF EXISTS trg_clinical_notes_counter ON clinical_notes;
+CREATE TRIGGER trg_clinical_notes_counter
+    AFTER INSERT OR DELETE ON clinical_notes
+    FOR EACH ROW EXECUTE FUNCTION bump_pipeline_counter();
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_clinical_notes_patient_id ON clinical_notes(patient_id);
+CREATE INDEX IF NOT EXISTS idx_clinical_notes_keyset ON clinical_notes(created_at DESC, note_id DESC);
+CREATE INDEX IF NOT EXISTS idx_synthetic_patients_keyset ON synthetic_patients(created_at DESC, patient_id DESC);
+CREATE INDEX IF NOT EXISTS idx_synthetic_patients_resource_type ON synthetic_patients(resource_type);
 CREATE INDEX IF NOT EXISTS idx_clinical_notes_specialty ON clinical_notes(specialty);
 CREATE INDEX IF NOT EXISTS idx_clinical_notes_prior_auth ON clinical_notes(prior_auth_required);
 CREATE INDEX IF NOT EXISTS idx_policy_chunks_payer_specialty ON policy_chunks(payer_id, specialty);
-CREATE INDEX IF NOT EXISTS idx_policy_chunks_embedding ON policy_chunks USING ivfflat (chunk_embedding vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS idx_policy_chunks_specialty ON policy_chunks(specialty);
+CREATE INDEX IF NOT EXISTS idx_policy_chunks_embedding ON policy_chunks USING hnsw (chunk_embedding_half halfvec_cosine_ops);
+-- ANN index so ORDER BY embedding <=> $1 is sub-linear instead of an
+-- exact scan over every embedded note
+CREATE INDEX IF NOT EXISTS idx_clinical_notes_embedding ON clinical_notes USING hnsw (embedding vector_cosine_ops);
 
 -- Insert sample payer policies for testing
 INSERT INTO policy_chunks (payer_id, policy_id, specialty, chunk_text, metadata) VALUES
@@ -13,6 +13,13 @@ import sys
 from pathlib import Path
 import os
 
+import numpy as np
+
+try:
+    from pgvector.asyncpg import register_vector
+except ImportError:
+    register_vector = None
+
 # Add the app directory to Python path so we can import our services
 sys.path.append(str(Path(__file__).parent.parent))
 
@@ -27,28 +34,67 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def test_database_connection(db_url: str):
+def format_vector_text(embedding) -> str:
+    """Build a pgvector text literal with one NumPy C-level str pass"""
+    arr = np.asarray(embedding, dtype=np.float32)
+    return "[" + ",".join(arr.astype(str)) + "]"
+
+
+def _decode_vector_text(value: str) -> np.ndarray:
+    """Parse a pgvector text literal back into a float32 array"""
+    return np.array(value[1:-1].split(','), dtype=np.float32)
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Per-connection pool setup: vector codec plus ANN recall knob"""
+    if register_vector is not None:
+        await register_vector(conn)
+    else:
+        # pgvector's asyncpg codec is unavailable: fall back to a text
+        # codec whose encoder is a single vectorized astype(str) rather
+        # than 1536 interpreted float-to-str calls per query
+        await conn.set_type_codec(
+            'vector',
+            encoder=format_vector_text,
+            decoder=_decode_vector_text,
+            format='text'
+        )
+    # hnsw.ef_search bounds the candidate list the ANN index walks per
+    # query; 40 is a recall/latency middle ground for LIMIT 10
+    await conn.execute("SET hnsw.ef_search = 40")
+
+
+async def check_ann_plan(conn: asyncpg.Connection, query: str, *args) -> bool:
+    """Verify the planner uses the ANN index rather than an exact KNN scan"""
+    plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+    if "idx_clinical_notes_embedding" in plan:
+        logger.info("✓ Planner is using the clinical_notes ANN index")
+        return True
+    logger.error(
+        "Planner is NOT using idx_clinical_notes_embedding — vector search "
+        "is an exact O(N) scan; check the index exists and the table is analyzed"
+    )
+    return False
+
+
+async def test_database_connection(pool: asyncpg.Pool):
     """Test basic database connectivity"""
     try:
-        conn = await asyncpg.connect(db_url)
-        
-        # Test basic query
-        result = await conn.fetchval("SELECT 1")
-        assert result == 1
-        
-        # Test pgvector extension
-        result = await conn.fetchval("SELECT COUNT(*) FROM pg_extension WHERE extname = 'vector'")
-        if result == 0:
-            logger.error("pgvector extension not installed")
-            await conn.close()
-            return False
-        
+        async with pool.acquire() as conn:
+            # Test basic query
+            result = await conn.fetchval("SELECT 1")
+            assert result == 1
+
+            # Test pgvector extension
+            result = await conn.fetchval("SELECT COUNT(*) FROM pg_extension WHERE extname = 'vector'")
+            if result == 0:
+                logger.error("pgvector extension not installed")
+                return False
+
         logger.info("✓ Database connection successful")
         logger.info("✓ pgvector extension is installed")
-        
-        await conn.close()
         return True
-        
+
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         return False
@@ -79,136 +125,127 @@ async def test_embedding_service():
         return False, None
 
 
-async def test_policy_search(db_url: str, embedding_service: EmbeddingService):
+async def test_policy_search(pool: asyncpg.Pool, embedding_service: EmbeddingService):
     """Test policy chunk similarity search"""
     try:
-        conn = await asyncpg.connect(db_url)
-        
-        # Check if we have policy chunks
-        chunk_count = await conn.fetchval("SELECT COUNT(*) FROM policy_chunks")
-        logger.info(f"Found {chunk_count} policy chunks in database")
-        
-        if chunk_count == 0:
-            logger.warning("No policy chunks found. Skipping policy search test.")
-            await conn.close()
-            return True
-        
-        # Generate embedding for test query
-        test_query = "chemotherapy prior authorization requirements"
-        query_embedding = embedding_service.embed_text(test_query)
-        
-        # Convert to PostgreSQL array format
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-        
-        # Test the search function
-        query = """
-            SELECT * FROM search_similar_policies(
-                $1::vector,
-                0.1,  -- Low threshold to get results
-                5,
-                NULL
+        async with pool.acquire() as conn:
+            # Check if we have policy chunks
+            chunk_count = await conn.fetchval("SELECT COUNT(*) FROM policy_chunks")
+            logger.info(f"Found {chunk_count} policy chunks in database")
+
+            if chunk_count == 0:
+                logger.warning("No policy chunks found. Skipping policy search test.")
+                return True
+
+            # Generate embedding for test query; the registered codec
+            # sends the ndarray in pgvector's binary wire format
+            test_query = "chemotherapy prior authorization requirements"
+            query_embedding = np.asarray(
+                embedding_service.embed_text(test_query), dtype=np.float32
             )
-        """
-        
-        results = await conn.fetch(query, embedding_str)
-        
+
+            # Test the search function
+            query = """
+                SELECT * FROM search_similar_policies(
+                    $1,
+                    0.1,  -- Low threshold to get results
+                    5,
+                    NULL
+                )
+            """
+
+            results = await conn.fetch(query, query_embedding)
+
         logger.info(f"✓ Policy search returned {len(results)} results")
-        
+
         for i, result in enumerate(results[:3]):  # Show top 3
             logger.info(f"  {i+1}. {result['payer_id']} - {result['policy_id']} "
                        f"(similarity: {result['similarity']:.3f})")
             logger.info(f"     {result['chunk_text'][:100]}...")
-        
-        await conn.close()
+
         return True
-        
+
     except Exception as e:
         logger.error(f"Policy search test failed: {e}")
         return False
 
 
-async def test_clinical_notes_search(db_url: str, embedding_service: EmbeddingService):
+async def test_clinical_notes_search(pool: asyncpg.Pool, embedding_service: EmbeddingService):
     """Test clinical notes similarity search"""
     try:
-        conn = await asyncpg.connect(db_url)
-        
-        # Check if we have clinical notes
-        notes_count = await conn.fetchval("SELECT COUNT(*) FROM clinical_notes")
-        logger.info(f"Found {notes_count} clinical notes in database")
-        
-        if notes_count == 0:
-            logger.warning("No clinical notes found. Skipping notes search test.")
-            await conn.close()
-            return True
-        
-        # Get a sample note to test similarity
-        sample_note = await conn.fetchrow("""
-            SELECT note_id, LEFT(deidentified_text, 200) as text_preview, specialty
-            FROM clinical_notes 
-            WHERE deidentified_text IS NOT NULL 
-            LIMIT 1
-        """)
-        
-        if not sample_note:
-            logger.warning("No processed notes found. Skipping notes search test.")
-            await conn.close()
-            return True
-        
-        logger.info(f"Using sample note from {sample_note['specialty']} specialty")
-        logger.info(f"Sample text: {sample_note['text_preview']}...")
-        
-        # Generate embedding for similar query
-        query_text = f"patient with {sample_note['specialty']} condition"
-        query_embedding = embedding_service.embed_text(query_text)
-        
-        # Convert to PostgreSQL array format
-        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-        
-        # Test similarity search
-        query = """
-            SELECT note_id, patient_id, specialty, prior_auth_status,
-                   LEFT(deidentified_text, 100) as text_preview,
-                   1 - (embedding <=> $1::vector) as similarity
-            FROM clinical_notes 
-            WHERE embedding IS NOT NULL
-            ORDER BY embedding <=> $1::vector
-            LIMIT 5
-        """
-        
-        results = await conn.fetch(query, embedding_str)
-        
+        async with pool.acquire() as conn:
+            # Check if we have clinical notes
+            notes_count = await conn.fetchval("SELECT COUNT(*) FROM clinical_notes")
+            logger.info(f"Found {notes_count} clinical notes in database")
+
+            if notes_count == 0:
+                logger.warning("No clinical notes found. Skipping notes search test.")
+                return True
+
+            # Get a sample note to test similarity
+            sample_note = await conn.fetchrow("""
+                SELECT note_id, LEFT(deidentified_text, 200) as text_preview, specialty
+                FROM clinical_notes
+                WHERE deidentified_text IS NOT NULL
+                LIMIT 1
+            """)
+
+            if not sample_note:
+                logger.warning("No processed notes found. Skipping notes search test.")
+                return True
+
+            logger.info(f"Using sample note from {sample_note['specialty']} specialty")
+            logger.info(f"Sample text: {sample_note['text_preview']}...")
+
+            # Generate embedding for similar query
+            query_text = f"patient with {sample_note['specialty']} condition"
+            query_embedding = np.asarray(
+                embedding_service.embed_text(query_text), dtype=np.float32
+            )
+
+            # Test similarity search
+            query = """
+                SELECT note_id, patient_id, specialty, prior_auth_status,
+                       LEFT(deidentified_text, 100) as text_preview,
+                       1 - (embedding <=> $1) as similarity
+                FROM clinical_notes
+                WHERE embedding IS NOT NULL
+                ORDER BY embedding <=> $1
+                LIMIT 5
+            """
+
+            await check_ann_plan(conn, query, query_embedding)
+            results = await conn.fetch(query, query_embedding)
+
         logger.info(f"✓ Clinical notes search returned {len(results)} results")
-        
+
         for i, result in enumerate(results):
             logger.info(f"  {i+1}. {result['note_id']} ({result['specialty']}) "
                        f"- {result['prior_auth_status']} "
                        f"(similarity: {result['similarity']:.3f})")
             logger.info(f"     {result['text_preview']}...")
-        
-        await conn.close()
+
         return True
-        
+
     except Exception as e:
         logger.error(f"Clinical notes search test failed: {e}")
         return False
 
 
-async def run_performance_test(db_url: str, embedding_service: EmbeddingService):
+async def run_performance_test(pool: asyncpg.Pool, embedding_service: EmbeddingService):
     """Run a performance test on vector search"""
     try:
-        conn = await asyncpg.connect(db_url)
-        
-        # Check total records
-        total_notes = await conn.fetchval("SELECT COUNT(*) FROM clinical_notes WHERE embedding IS NOT NULL")
-        total_policies = await conn.fetchval("SELECT COUNT(*) FROM policy_chunks WHERE chunk_embedding IS NOT NULL")
-        
+        async with pool.acquire() as conn:
+            # Check total records
+            total_notes = await conn.fetchval("SELECT COUNT(*) FROM clinical_notes WHERE embedding IS NOT NULL")
+            total_policies = await conn.fetchval("SELECT COUNT(*) FROM policy_chunks WHERE chunk_embedding IS NOT NULL")
+
         logger.info(f"Performance test with {total_notes} notes and {total_policies} policies")
-        
+
         if total_notes == 0 and total_policies == 0:
             logger.warning("No embedded data found for performance test")
-            await conn.close()
             return True
-        
+
         # Test query
         test_queries = [
             "oncology chemotherapy treatment",
@@ -216,38 +253,68 @@ async def run_performance_test(db_url: str, embedding_service: EmbeddingService)
             "imaging MRI scan prior authorization",
             "patient diagnosis and treatment plan"
         ]
-        
+
         import time
-        
-        for query_text in test_queries:
-            start_time = time.time()
-            
-            # Generate embedding
-            query_embedding = embedding_service.embed_text(query_text)
-            embedding_time = time.time() - start_time
-            
-            # Search clinical notes
-            embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-            
+
+        # Warm-up outside the timers: the first encode pays lazy model
+        # load, tokenizer setup and (on GPU) CUDA context init, which
+        # would otherwise pollute the first measurement
+        embedding_service.embed_text("warmup")
+
+        # One batched call embeds all four queries in a single
+        # forward pass; the per-query embedding cost reported below
+        # is the batch time amortized over the queries
+        embed_start = time.time()
+        query_embeddings = embedding_service.embed_batch(test_queries)
+        embedding_time = (time.time() - embed_start) / len(test_queries)
+
+        search_sql = """
+            SELECT note_id, 1 - (embedding <=> $1) as similarity
+            FROM clinical_notes
+            WHERE embedding IS NOT NULL
+            ORDER BY embedding <=> $1
+            LIMIT 10
+        """
+
+        # Confirm the ANN index is in play before timing anything
+        async with pool.acquire() as conn:
+            await check_ann_plan(
+                conn, search_sql, np.asarray(query_embeddings[0], dtype=np.float32)
+            )
+
+        # Pin one pooled connection per query (max_size=4 covers all
+        # four) and prepare the statement on each up front, so the
+        # parse+plan round-trip happens outside the timed phase and
+        # every timed fetch is a bare Bind/Execute
+        conns = [await pool.acquire() for _ in query_embeddings]
+        try:
+            statements = await asyncio.gather(*[
+                conn.prepare(search_sql) for conn in conns
+            ])
+
+            # The searches run concurrently, so the phase costs roughly
+            # the slowest query instead of the sum
             search_start = time.time()
-            results = await conn.fetch("""
-                SELECT note_id, 1 - (embedding <=> $1::vector) as similarity
-                FROM clinical_notes 
-                WHERE embedding IS NOT NULL
-                ORDER BY embedding <=> $1::vector
-                LIMIT 10
-            """, embedding_str)
+            all_results = await asyncio.gather(*[
+                stmt.fetch(np.asarray(embedding, dtype=np.float32))
+                for stmt, embedding in zip(statements, query_embeddings)
+            ])
             search_time = time.time() - search_start
-            
-            total_time = time.time() - start_time
-            
+        finally:
+            for conn in conns:
+                await pool.release(conn)
+
+        logger.info(
+            f"Embedding: {embedding_time:.3f}s/query, "
+            f"concurrent search phase: {search_time:.3f}s for {len(test_queries)} queries"
+        )
+
+        for query_text, results in zip(test_queries, all_results):
             logger.info(f"Query: '{query_text}'")
-            logger.info(f"  Embedding: {embedding_time:.3f}s, Search: {search_time:.3f}s, Total: {total_time:.3f}s")
             logger.info(f"  Found {len(results)} results, top similarity: {results[0]['similarity']:.3f}")
-        
-        await conn.close()
+
         return True
-        
+
     except Exception as e:
         logger.error(f"Performance test failed: {e}")
         return False
@@ -259,39 +326,57 @@ async def main_async(args):
     db_url = settings.database_url.replace("postgresql://", "postgresql://")
     
     logger.info("=== Vector Similarity Retrieval Test ===")
-    
-    # Test 1: Database connection
-    logger.info("1. Testing database connection...")
-    if not await test_database_connection(db_url):
-        logger.error("Database connection test failed")
-        return False
-    
-    # Test 2: Embedding service
-    logger.info("2. Testing embedding service...")
-    embedding_ready, embedding_service = await test_embedding_service()
-    if not embedding_ready:
-        logger.error("Embedding service test failed")
-        return False
-    
-    # Test 3: Policy search
-    logger.info("3. Testing policy chunk similarity search...")
-    if not await test_policy_search(db_url, embedding_service):
-        logger.error("Policy search test failed")
-        return False
-    
-    # Test 4: Clinical notes search
-    logger.info("4. Testing clinical notes similarity search...")
-    if not await test_clinical_notes_search(db_url, embedding_service):
-        logger.error("Clinical notes search test failed")
+
+    # One pool shared by every test: the TCP/TLS/auth handshake is paid
+    # once per pooled connection instead of once per test, and asyncpg's
+    # prepared-statement cache survives across queries
+    try:
+        # _init_connection installs pgvector's binary codec on each new
+        # connection (ndarrays go over the wire directly instead of as a
+        # ~30 KB comma-joined text literal) and sets hnsw.ef_search
+        pool = await asyncpg.create_pool(
+            db_url, min_size=2, max_size=4, statement_cache_size=1024,
+            init=_init_connection
+        )
+    except Exception as e:
+        logger.error(f"Failed to create connection pool: {e}")
         return False
-    
-    # Test 5: Performance test
-    if args.performance:
-        logger.info("5. Running performance test...")
-        if not await run_performance_test(db_url, embedding_service):
-            logger.error("Performance test failed")
+
+    try:
+        # Test 1: Database connection
+        logger.info("1. Testing database connection...")
+        if not await test_database_connection(pool):
+            logger.error("Database connection test failed")
             return False
-    
+
+        # Test 2: Embedding service
+        logger.info("2. Testing embedding service...")
+        embedding_ready, embedding_service = await test_embedding_service()
+        if not embedding_ready:
+            logger.error("Embedding service test failed")
+            return False
+
+        # Test 3: Policy search
+        logger.info("3. Testing policy chunk similarity search...")
+        if not await test_policy_search(pool, embedding_service):
+            logger.error("Policy search test failed")
+            return False
+
+        # Test 4: Clinical notes search
+        logger.info("4. Testing clinical notes similarity search...")
+        if not await test_clinical_notes_search(pool, embedding_service):
+            logger.error("Clinical notes search test failed")
+            return False
+
+        # Test 5: Performance test
+        if args.performance:
+            logger.info("5. Running performance test...")
+            if not await run_performance_test(pool, embedding_service):
+                logger.error("Performance test failed")
+                return False
+    finally:
+        await pool.close()
+
     logger.info("=== All tests passed! ===")
     logger.info("✓ pgvector similarity search is working correctly")
     return True
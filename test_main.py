@@ -1,19 +1,60 @@
 """
 Simple FastAPI test app
+
+Run under uvicorn's C event loop and parser for best probe throughput:
+
+    uvicorn test_main:app --loop uvloop --http httptools
 """
 
+try:
+    # uvloop ships with uvicorn[standard]; installing it here also
+    # covers embedders that create the loop themselves
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 from fastapi import FastAPI
 
-app = FastAPI(
+fastapi_app = FastAPI(
     title="GreenLightPA API Test",
     description="Test API",
     version="1.0.0"
 )
 
-@app.get("/")
+@fastapi_app.get("/")
 async def root():
     return {"message": "Hello World"}
 
-@app.get("/health")
-async def health():
-    return {"status": "healthy"} 
\ No newline at end of file
+# Pre-built health response: liveness probes skip FastAPI's routing,
+# middleware stack and JSONResponse construction entirely
+_HEALTH_BODY = b'{"status":"healthy"}'
+_HEALTH_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_HEALTH_BODY)).encode()),
+]
+
+
+async def _health_asgi(scope, receive, send):
+    if scope["method"] != "GET":
+        await send({
+            "type": "http.response.start",
+            "status": 405,
+            "headers": [(b"allow", b"GET"), (b"content-length", b"0")],
+        })
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": _HEALTH_HEADERS,
+    })
+    await send({"type": "http.response.body", "body": _HEALTH_BODY})
+
+
+async def app(scope, receive, send):
+    """Outer ASGI app: short-circuit /health, forward everything else"""
+    if scope["type"] == "http" and scope["path"] == "/health":
+        await _health_asgi(scope, receive, send)
+        return
+    await fastapi_app(scope, receive, send)